@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark of loading time series of processing blocks as done by bin/ricemap.py: every scene file is opened and read
+by window for every block, or the time series of the block is read from temporal cube (georice.cube) at once.
+
+The cube keeps chunks frame-major (frames, rows, cols), so a scene is appended by one sequential write per chunk. It
+is compared with chunks stored time-innermost (rows, cols, frames), where the series of a block is one contiguous
+slice, but every appended frame is scattered over the whole chunk file.
+
+    python benchmarks/cube.py [scene size in px] [number of dates] [processing block in px] [storage]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy
+from rasterio import open as raster_open
+from rasterio.shutil import copy as raster_copy
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from georice.cube import SceneCube
+from georice.imagery import GetSentinel
+from georice.storage import SceneStorage
+
+TRANSFORM = Affine(10, 0, 500000, 0, -10, 1200000)
+
+
+def write_scenes(folder, size, dates, storage):
+    sentinel = GetSentinel.__new__(GetSentinel)
+    sentinel.nodata = -999
+    sentinel.config = {'compress': 'zstd', 'block_size': 1024, 'storage': storage.format}
+    rng = numpy.random.default_rng(0)
+    paths = []
+    for date in range(dates):
+        path = os.path.join(folder, f'S1A_T_VH_DES_018_{date:08d}_txxxxxx.tif')
+        with raster_open(path + '.part', 'w', driver='GTiff', width=size, height=size, count=1, crs='EPSG:32648',
+                         transform=TRANSFORM, tiled=True, blockxsize=1024, blockysize=1024,
+                         **storage.profile()) as dataset:
+            storage.write_metadata(dataset)
+            dataset.write(storage.encode(rng.gamma(4.4, 0.05 / 4.4, (size, size)).astype('float32')), 1)
+        raster_copy(path + '.part', path, **sentinel.cog_options())
+        os.remove(path + '.part')
+        paths.append(path)
+    return paths
+
+
+def blocks(size, block):
+    for y in range(0, size, block):
+        for x in range(0, size, block):
+            yield Window(x, y, min(block, size - x), min(block, size - y))
+
+
+def read_files(paths, size, block, storage):
+    series = numpy.empty((block, block, len(paths)), dtype='float32')
+    for window in blocks(size, block):
+        for i, path in enumerate(paths):
+            with raster_open(path) as dataset:
+                series[:window.height, :window.width, i] = storage.decode(dataset.read(1, window=window))
+
+
+def read_cube(cube, size, block):
+    series = numpy.empty((block, block, len(cube.names)), dtype='float32')
+    for window in blocks(size, block):
+        series[:window.height, :window.width] = cube.read(window)
+
+
+def append_pixel_major(cube, paths):
+    """Append scenes into chunks of cube grid stored time-innermost with room for all frames"""
+    dtype = cube.dtype
+    for i, path in enumerate(paths):
+        with raster_open(path) as dataset:
+            for chunk_path, chunk in cube.chunks():
+                chunk_path = chunk_path.replace('.bin', '.pix')
+                data = numpy.memmap(chunk_path, dtype=dtype, mode='r+' if os.path.exists(chunk_path) else 'w+',
+                                    shape=(chunk.height, chunk.width, len(paths)))
+                data[:, :, i] = dataset.read(1, window=chunk).astype(dtype)
+                data.flush()
+                del data
+
+
+def read_pixel_major(cube, size, block, frames):
+    storage = cube.storage
+    series = numpy.empty((block, block, frames), dtype='float32')
+    for window in blocks(size, block):
+        for chunk_path, chunk in cube.chunks(window):
+            data = numpy.memmap(chunk_path.replace('.bin', '.pix'), dtype=cube.dtype, mode='r',
+                                shape=(chunk.height, chunk.width, frames))
+            rows = slice(max(window.row_off, chunk.row_off), min(window.row_off + window.height, chunk.row_off + chunk.height))
+            cols = slice(max(window.col_off, chunk.col_off), min(window.col_off + window.width, chunk.col_off + chunk.width))
+            series[rows.start - window.row_off:rows.stop - window.row_off,
+                   cols.start - window.col_off:cols.stop - window.col_off] = storage.decode(
+                data[rows.start - chunk.row_off:rows.stop - chunk.row_off, cols.start - chunk.col_off:cols.stop - chunk.col_off])
+            del data
+
+
+def main(size=4096, dates=30, block=2048, storage='uint16'):
+    storage = SceneStorage(storage)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_scenes(folder, size, dates, storage)
+        cube = SceneCube(os.path.join(folder, 'cube'))
+        cube.create(size, size, TRANSFORM, 'EPSG:32648', storage, chunk_size=block)
+        start = time.perf_counter()
+        for path in paths:
+            cube.append(path)
+        append_time = time.perf_counter() - start
+        start = time.perf_counter()
+        append_pixel_major(cube, paths)
+        pixel_append_time = time.perf_counter() - start
+        cube_size = sum(entry.stat().st_size for entry in os.scandir(cube.path) if entry.name.endswith('.bin'))
+        files_size = sum(os.path.getsize(path) for path in paths)
+
+        print(f'{dates} scenes {size}x{size} px stored as {storage.format}, read by {block}x{block} px blocks')
+        print(f'append into cube: {append_time:.2f} s, cube {cube_size / 1e6:.0f} MB, files {files_size / 1e6:.0f} MB')
+        print(f'append into time-innermost chunks: {pixel_append_time:.2f} s')
+        for name, run in [('scene files', lambda: read_files(paths, size, block, storage)),
+                          ('cube', lambda: read_cube(cube, size, block)),
+                          ('time-innermost', lambda: read_pixel_major(cube, size, block, dates))]:
+            # drop page cache is not possible without root, both variants are measured warm
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f'{name:>14}: {elapsed:.2f} s => {dates * size * size * 4 / 1e6 / elapsed:.0f} MB/s of float32 series')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]], *sys.argv[4:5])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+End to end benchmark of GetSentinel.search and GetSentinel.download against local stand-in of Sentinel Hub
+(benchmarks/fake_sentinelhub.py). Reports tiles/s, MB/s, request latency percentiles and peak RSS. Georice config
+file is not modified, benchmark overrides config values of its GetSentinel instance only.
+
+    python benchmarks/download.py --days 60 --aoi-km 50 --workers 8 --latency 0.2
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from fake_sentinelhub import FakeSentinelHub
+from georice.imagery import GetSentinel
+from georice.utils import Config
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=60, help='length of searched period in days')
+    parser.add_argument('--aoi-km', type=float, default=20, help='side of square AOI in km')
+    parser.add_argument('--workers', type=int, default=8, help='max_workers of download')
+    parser.add_argument('--latency', type=float, default=0.1, help='latency of fake process API in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of HTTP 500 of process API')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='parallel requests over it get HTTP 429')
+    parser.add_argument('--single-band', action='store_true', help='request polarizations one by one')
+    args = parser.parse_args()
+
+    server = FakeSentinelHub(latency=args.latency, error_rate=args.error_rate,
+                             max_concurrent=args.max_concurrent).start()
+    with tempfile.TemporaryDirectory() as output:
+        config = Config.load().replace(output=output, max_workers=args.workers, retry_backoff=0.1,
+                                       multiband_request=not args.single_band, cache=False, catalog=False)
+        sentinel = GetSentinel(config)
+        sentinel.SHConfig = server.configure(sentinel.SHConfig)
+
+        # 3857 AOI in rice growing area of Mekong delta
+        x, y, side = 11800000, 1100000, args.aoi_km * 1000
+        start = time.perf_counter()
+        end = datetime(2020, 1, 1) + timedelta(days=args.days)
+        sentinel.search([x, y, x + side, y + side], 3857, ('20200101', end.strftime('%Y%m%d')))
+        search_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sentinel.download('Benchmark')
+        download_time = time.perf_counter() - start
+        written = sum(entry.stat().st_size for entry in os.scandir(os.path.join(output, 'Benchmark', 'scenes')))
+    server.stop()
+
+    report, stats = sentinel.download_report, server.stats
+    print()
+    print(f'scenes: {len(sentinel._scenes)}, search: {search_time:.2f} s ({stats["wfs"]} WFS requests)')
+    print(f'tiles: {stats["tiles"]} in {download_time:.2f} s => {stats["tiles"] / download_time:.1f} tiles/s, '
+          f'{stats["bytes"] / 1e6 / download_time:.1f} MB/s downloaded, {written / 1e6:.1f} MB written')
+    print(f'errors: {stats["errors"]}, throttled: {stats["throttled"]}, retries: {report.get("retries", 0)}')
+    if report.get('jobs'):
+        print(f'latency: p50 {report["p50"]:.3f} s, p95 {report["p95"]:.3f} s, p99 {report["p99"]:.3f} s')
+    session = sentinel.session.report()
+    print(f'connections: {session["connections"]} for {session["requests"]} requests ({session["reuse"]:.0%} reused), '
+          f'tokens: {stats["tokens"]}, authentication: {session["auth_time"]:.2f} s')
+    print(f'peak RSS: {peak_rss_mb():.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Local stand-in of Sentinel Hub services used by GetSentinel: OAuth token, WFS GetFeature and process API. Process API
+returns synthetic Float32 TIFF tiles. Latency, error rate and throttling of the service are configurable.
+
+    python benchmarks/fake_sentinelhub.py [port]
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy
+from rasterio.io import MemoryFile
+
+
+class FakeSentinelHub(ThreadingHTTPServer):
+    """
+    HTTP server answering Sentinel Hub requests of georice
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, error_rate=0.0, max_concurrent=None, scenes_per_day=0.2, seed=0):
+        """
+        :param port: int, port of server, 0 means any free port
+        :param latency: float, delay of every process API response in seconds
+        :param error_rate: float, probability of HTTP 500 response of process API
+        :param max_concurrent: int, process API requests over this number of parallel requests get HTTP 429
+        :param scenes_per_day: float, number of acquisitions per day returned by WFS
+        :param seed: int, seed of random generator
+        """
+        super().__init__(('127.0.0.1', port), FakeSentinelHubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.scenes_per_day = scenes_per_day
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.stats = {'tiles': 0, 'bytes': 0, 'errors': 0, 'throttled': 0, 'wfs': 0, 'tokens': 0}
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self):
+        """Serve requests in a daemon thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def configure(self, config):
+        """Point sentinelhub.SHConfig to the server"""
+        # server speaks plain http, oauthlib refuses it unless told otherwise
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+        config.sh_base_url = self.url
+        for name, value in [('sh_auth_base_url', self.url), ('sh_token_url', self.url + '/oauth/token')]:
+            if hasattr(config, name):
+                setattr(config, name, value)
+        config.sh_client_id = config.sh_client_id or 'fake-client'
+        config.sh_client_secret = config.sh_client_secret or 'fake-secret'
+        config.instance_id = config.instance_id or 'fake-instance'
+        return config
+
+    def features(self, bbox, crs, period, offset, limit):
+        """Return WFS features of synthetic scenes fully covering bbox"""
+        start, end = period
+        step = timedelta(days=1 / self.scenes_per_day)
+        minx, miny, maxx, maxy = bbox
+        geometry = {'type': 'MultiPolygon',
+                    'coordinates': [[[[minx - 1e4, miny - 1e4], [maxx + 1e4, miny - 1e4], [maxx + 1e4, maxy + 1e4],
+                                      [minx - 1e4, maxy + 1e4], [minx - 1e4, miny - 1e4]]]],
+                    'crs': {'type': 'name', 'properties': {'name': crs}}}
+        features, time, number = [], start, 0
+        while time <= end:
+            satellite, orbit = ('S1A', 30000 + 12 * number) if number % 2 == 0 else ('S1B', 20000 + 12 * number)
+            stamp = time.strftime('%Y%m%dT%H%M%S')
+            stop = (time + timedelta(seconds=25)).strftime('%Y%m%dT%H%M%S')
+            features.append({'type': 'Feature', 'geometry': geometry,
+                             'properties': {'id': f'{satellite}_IW_GRDH_1SDV_{stamp}_{stop}_{orbit:06d}_000000_0000',
+                                            'orbitDirection': 'DESCENDING', 'crs': crs}})
+            time, number = time + step, number + 1
+        return features[offset:offset + limit]
+
+    def tile(self, width, height, bands, data_mask=False):
+        """Return synthetic gamma0 tile as Float32 GeoTIFF bytes, dataMask band is the last one"""
+        data = numpy.random.default_rng(self.random.randrange(2 ** 32)).uniform(0.001, 0.3, (bands, height, width))
+        if data_mask:
+            data[-1] = 1
+        with MemoryFile() as memory:
+            with memory.open(driver='GTiff', width=width, height=height, count=bands, dtype='float32') as dataset:
+                dataset.write(data.astype('float32'))
+            return memory.read()
+
+
+class FakeSentinelHubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if '/ogc/wfs' not in url.path:
+            return self.reply(404)
+        params = {key.upper(): values[0] for key, values in parse_qs(url.query).items()}
+        bbox = [float(coor) for coor in params['BBOX'].split(',')]
+        period = [datetime.fromisoformat(time) for time in params['TIME'].split('/')]
+        features = self.server.features(bbox, params.get('SRSNAME', 'EPSG:3857'), period,
+                                        int(params.get('FEATURE_OFFSET', 0)), int(params.get('MAXFEATURES', 100)))
+        with self.server.lock:
+            self.server.stats['wfs'] += 1
+        self.reply(200, json.dumps({'type': 'FeatureCollection', 'features': features}).encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.endswith('/token'):
+            with self.server.lock:
+                self.server.stats['tokens'] += 1
+            token = {'access_token': 'fake-token', 'token_type': 'Bearer', 'expires_in': 3600,
+                     'expires_at': time.time() + 3600}
+            return self.reply(200, json.dumps(token).encode())
+        if not self.path.startswith('/api/v1/process'):
+            return self.reply(404)
+
+        server = self.server
+        with server.lock:
+            throttled = server.max_concurrent is not None and server.active >= server.max_concurrent
+            failed = not throttled and server.random.random() < server.error_rate
+            if throttled:
+                server.stats['throttled'] += 1
+            elif failed:
+                server.stats['errors'] += 1
+            else:
+                server.active += 1
+        if throttled:
+            return self.reply(429, b'{"error": "Too many requests"}', headers={'Retry-After': '1'})
+        if failed:
+            return self.reply(500, b'{"error": "Internal error"}')
+
+        try:
+            request = json.loads(body)
+            output = request.get('output', {})
+            bands = int(re.search(r'bands:\s*(\d+)', request['evalscript']).group(1))
+            tiff = server.tile(int(output['width']), int(output['height']), bands, 'dataMask' in request['evalscript'])
+            time.sleep(server.latency)
+        finally:
+            with server.lock:
+                server.active -= 1
+        with server.lock:
+            server.stats['tiles'] += 1
+            server.stats['bytes'] += len(tiff)
+        self.reply(200, tiff, content_type='image/tiff')
+
+
+if __name__ == '__main__':
+    server = FakeSentinelHub(int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f'Fake Sentinel Hub is listening at {server.url}')
+    server.serve_forever()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of masking of pixels outside of scene footprint in GetSentinel.download. For every partially covered
+tile of a dual polarization scene it compares:
+- per tile: difference of tile and footprint rasterized for every tile (data_mask = False)
+- per scene: footprint rasterized once on the whole AOI pixel grid and sliced per tile
+- dataMask: mask taken from the dataMask band returned with the tile (data_mask = True)
+
+    python benchmarks/masking.py [aoi size in km] [tile size in px]
+"""
+
+import math
+import sys
+import time
+import numpy
+from shapely.affinity import rotate
+from shapely.geometry import Polygon, box
+from georice.imagery import GetSentinel, Geometry
+from georice.download import DownloadPlan, PARTIAL
+
+RESOLUTION = 10
+NODATA = -999
+
+
+def per_tile(tiles, footprint, windows):
+    for index, response in tiles.items():
+        bbox, upper_left, _ = windows[index]
+        mask = GetSentinel.footprint_mask(bbox.difference(footprint), upper_left, RESOLUTION, response.shape[:2])
+        if mask is not None:
+            [numpy.where(mask, NODATA, response[:, :, band]) for band in range(2)]
+
+
+def per_scene(tiles, footprint, windows, aoi, shape):
+    height, width = shape
+    x0, y0 = aoi.upper_left
+    extent = box(x0, y0 - height * RESOLUTION, x0 + width * RESOLUTION, y0)
+    mask = GetSentinel.footprint_mask(extent.difference(footprint), (x0, y0), RESOLUTION, shape)
+    for index, response in tiles.items():
+        window = windows[index][2]
+        tile_mask = mask[window.row_off:window.row_off + window.height, window.col_off:window.col_off + window.width]
+        [numpy.where(tile_mask, NODATA, response[:, :, band]) for band in range(2)]
+
+
+def data_mask(tiles):
+    for response in tiles.values():
+        mask = response[:, :, 2] == 0
+        [numpy.where(mask, NODATA, response[:, :, band]) for band in range(2)]
+
+
+def main(size_km=50, tile_px=500):
+    length = size_km * 1000
+    aoi = Geometry(box(0, 0, length, length), 3857, grid_leght=(tile_px * RESOLUTION, tile_px * RESOLUTION))
+    # skewed and densely sampled swath edge crossing the AOI, as for a typical Sentinel-1 scene
+    edge = [(length * 0.6 + 200 * math.sin(i / 10), length * 3 * i / 4000 - length) for i in range(4000)]
+    footprint = rotate(Polygon([(-length, 2 * length), (-length, -length)] + edge), 12, origin=(0, 0))
+
+    grid = list(aoi.iter())
+    nx, _ = aoi.grid_size
+    states = DownloadPlan(grid).classify(footprint)
+    raster_windows = GetSentinel.grid_windows(grid, nx, RESOLUTION)
+    shape = (sum(window.height for window in raster_windows[::nx]),
+             sum(window.width for window in raster_windows[:nx]))
+    windows = {index: (bbox, (bbox.bounds[0], bbox.bounds[3]), raster_windows[index])
+               for index, (bbox, _) in enumerate(grid)}
+    tiles = {index: numpy.ones((raster_windows[index].height, raster_windows[index].width, 3), dtype='float32')
+             for index, state in enumerate(states) if state == PARTIAL}
+    print(f'AOI {size_km}x{size_km} km, {len(grid)} tiles, {len(tiles)} partially covered')
+
+    for name, run in [('per tile', lambda: per_tile(tiles, footprint, windows)),
+                      ('per scene', lambda: per_scene(tiles, footprint, windows, aoi, shape)),
+                      ('dataMask', lambda: data_mask(tiles))]:
+        start = time.perf_counter()
+        run()
+        print(f'{name:>10}: {time.perf_counter() - start:.3f} s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
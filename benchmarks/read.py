@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark of windowed reads of scene files as done by bin/ricemap.py, which reads scenes in square windows of
+BLOCK_SIZE pixels. Synthetic gamma0 scene is written in the former layouts (striped LZW, tiled LZW), as cloud
+optimized GeoTIFF with every codec supported by GetSentinel and in quantized storage formats, which are decoded into
+linear gamma0 when read. Reports file size, write time, read throughput and maximal error of gamma0 in dB.
+
+    python benchmarks/read.py [scene size in px] [processing block in px]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy
+from rasterio import open as raster_open
+from rasterio.shutil import copy as raster_copy
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from georice.imagery import GetSentinel
+from georice.storage import SceneStorage
+
+TIFF_BLOCK_SIZE = 1024
+
+
+def scene(size, seed=0):
+    """Return synthetic gamma0 scene: smooth backscatter of fields multiplied by speckle"""
+    rng = numpy.random.default_rng(seed)
+    fields = rng.uniform(0.01, 0.3, (size // 64 + 1, size // 64 + 1))
+    backscatter = numpy.kron(fields, numpy.ones((64, 64)))[:size, :size]
+    return (backscatter * rng.gamma(4.4, 1 / 4.4, (size, size))).astype('float32')
+
+
+def write(path, array, options, storage):
+    size = array.shape[0]
+    profile = {'driver': 'GTiff', **storage.profile(), 'width': size, 'height': size, 'count': 1,
+               'crs': 'EPSG:32648', 'transform': Affine(10, 0, 500000, 0, -10, 1200000)}
+    if options.get('driver') == 'COG':
+        with raster_open(path + '.part', 'w', **profile, tiled=True, blockxsize=TIFF_BLOCK_SIZE,
+                         blockysize=TIFF_BLOCK_SIZE) as dataset:
+            storage.write_metadata(dataset)
+            dataset.write(storage.encode(array), 1)
+        raster_copy(path + '.part', path, **options)
+        os.remove(path + '.part')
+    else:
+        with raster_open(path, 'w', **profile, **options) as dataset:
+            dataset.write(array, 1)
+
+
+def read(path, block, storage):
+    """Read scene by windows and return it decoded into linear gamma0"""
+    with raster_open(path) as dataset:
+        array = numpy.empty((dataset.height, dataset.width), dtype='float32')
+        for y in range(0, dataset.height, block):
+            for x in range(0, dataset.width, block):
+                window = Window(x, y, min(block, dataset.width - x), min(block, dataset.height - y))
+                array[y:y + window.height, x:x + window.width] = storage.decode(dataset.read(1, window=window))
+    return array
+
+
+def main(size=8192, block=4096):
+    array = scene(size)
+    float32 = SceneStorage()
+    layouts = [('striped lzw', {'compress': 'lzw'}, float32),
+               ('tiled 256 lzw', {'compress': 'lzw', 'tiled': True, 'blockxsize': 256, 'blockysize': 256}, float32)]
+    sentinel = GetSentinel.__new__(GetSentinel)
+    sentinel.nodata = -999
+    for storage, codecs in [('float32', GetSentinel.CODECS), ('uint16', GetSentinel.CODECS), ('float16', ['zstd'])]:
+        for codec in codecs:
+            sentinel.config = {'compress': codec, 'block_size': TIFF_BLOCK_SIZE, 'storage': storage}
+            layouts.append((f'COG {codec} {storage}', sentinel.cog_options(), sentinel.storage))
+
+    print(f'scene {size}x{size} px ({array.nbytes / 1e6:.0f} MB), read by {block}x{block} px windows')
+    with tempfile.TemporaryDirectory() as folder:
+        for name, options, storage in layouts:
+            path = os.path.join(folder, name.replace(' ', '_') + '.tif')
+            start = time.perf_counter()
+            write(path, array, options, storage)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = read(path, block, storage)
+            read_time = time.perf_counter() - start
+            error = numpy.abs(10 * numpy.log10(decoded / array)).max()
+            print(f'{name:>21}: {os.path.getsize(path) / 1e6:7.1f} MB, write {write_time:5.2f} s, '
+                  f'read {read_time:5.2f} s => {array.nbytes / 1e6 / read_time:6.1f} MB/s, error {error:.4f} dB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
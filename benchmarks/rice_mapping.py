@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Benchmark of rice map classification of georice.engine on synthetic temporal statistics: rice_mapping thresholding
+four masks and cleaning every one by labeling of scipy as remove_small_objects and remove_small_holes do, compared with
+rice_mapping_fused (numba kernels, one labeling per mask) on the full raster and by blocks with halo in a thread pool.
+Rice maps of all variants have to be identical.
+
+    python benchmarks/rice_mapping.py [size in px] [processing block in px]
+
+Default raster 10000x10000 px needs about 5 GB of memory.
+"""
+
+import sys
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from georice import engine as ricemap
+from rasterio.windows import Window
+
+
+def statistics(size, seed=0):
+    """Return synthetic temporal mean, max increase, min and max: fields of 8..64 px with noise and nodata"""
+    rng = np.random.default_rng(seed)
+    result = []
+    for low, high in [(0., 0.2), (1., 6.), (0.001, 0.03), (0.005, 0.1)]:
+        field = rng.integers(8, 65)
+        values = rng.uniform(low, high, (size // field + 1, size // field + 1)).astype(np.float32)
+        values = np.repeat(np.repeat(values, field, axis=0), field, axis=1)[:size, :size]
+        result.append(values * rng.uniform(0.7, 1.3, (size, size)).astype(np.float32))
+    result[0][rng.random((size, size)) < 0.01] = 0
+    return result
+
+
+def blocks(stats, block, threads):
+    size = stats[0].shape[0]
+    out = np.zeros((size, size), dtype=np.uint8)
+    params = [[Window(x, y, block, block), *stats, ricemap.RICE_THRESHOLD_DB, out]
+              for x in range(0, size, block) for y in range(0, size, block)]
+    with ThreadPool(threads) as pool:
+        pool.starmap(ricemap.rice_mapping_block, params)
+    return out
+
+
+def main(size=10000, block=4096):
+    threads = max(4, cpu_count() // 2)
+    stats = statistics(size)
+    print(f'raster {size}x{size} px, blocks of {block} px, {threads} threads')
+    variants = [('rice_mapping', lambda: ricemap.rice_mapping(*stats, ricemap.RICE_THRESHOLD_DB)),
+                ('fused', lambda: ricemap.rice_mapping_fused(*stats, ricemap.RICE_THRESHOLD_DB)),
+                ('fused blocks', lambda: blocks(stats, block, threads))]
+    # compilation is excluded from measurement
+    ricemap.rice_mapping_fused(*[s[:64, :64] for s in stats], ricemap.RICE_THRESHOLD_DB)
+    expected = None
+    for name, run in variants:
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        expected = result if expected is None else expected
+        print(f'{name:>13}: {elapsed:6.2f} s => {size * size / 1e6 / elapsed:6.2f} Mpx/s, '
+              f'identical: {np.array_equal(expected, result)}, classes: {np.bincount(result.ravel(), minlength=5)}')
+        del result
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
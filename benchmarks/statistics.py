@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark of temporal statistics (mean, max increase, min, max) of georice.engine on a synthetic stack of gamma0.
+The former kernel, which allocates index and value arrays for every pixel, is run as a reference by chunks of lines
+in a thread pool as ricemap did. It is compared with the allocation-free serial kernel, with the parallel kernel
+sharing lines among numba threads and with the numpy engine processing chunks of lines in a thread pool, outputs of
+all engines have to be bit-identical.
+
+    python benchmarks/statistics.py [size in px] [number of dates] [processing block in px]
+
+Default stack 4096x4096 px x 60 dates needs about 4 GB of memory for gamma0 only.
+"""
+
+import sys
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import numba
+import numpy as np
+from georice import engine as ricemap
+
+mean_, max_, min_, min_argmin = ricemap.mean_, ricemap.max_, ricemap.min_, ricemap.min_argmin
+INF_NEG_FLOAT32, INF_POS_FLOAT32 = ricemap.INF_NEG_FLOAT32, ricemap.INF_POS_FLOAT32
+
+
+@numba.jit(nopython=True, nogil=True, fastmath=False)
+def reference_statistics(vh, time_0):
+    h, w = vh.shape[0:2]
+    out_mean = np.zeros((h, w), dtype=np.float32)
+    out_incr = np.zeros((h, w), dtype=np.float32)
+    out_min = np.zeros((h, w), dtype=np.float32)
+    out_max = np.zeros((h, w), dtype=np.float32)
+    for y in range(h):
+        for x in range(w):
+            mean_vh, incr_vh, min_vh, max_vh = 0, 0, INF_NEG_FLOAT32, INF_POS_FLOAT32
+            pixel_vh = vh[y, x, :]
+            db_filter_ids = np.where(pixel_vh > 0.0013)[0]
+            if len(db_filter_ids) > 0:
+                vh_tmp = pixel_vh[db_filter_ids]
+                mean_vh, max_vh, min_vh = mean_(vh_tmp), max_(vh_tmp), min_(vh_tmp)
+                if len(vh_tmp) > 1:
+                    t0_tmp = time_0[db_filter_ids]
+                    temporal_min, temporal_min_index = min_argmin(vh_tmp[:len(vh_tmp)//2])
+                    vh_select = vh_tmp[np.where(t0_tmp >= (t0_tmp[temporal_min_index] + 20))[0]]
+                    if len(vh_select) > 0:
+                        incr_vh = max_(vh_select) / temporal_min
+            out_mean[y, x] = mean_vh
+            out_incr[y, x] = incr_vh
+            out_min[y, x] = min_vh
+            out_max[y, x] = max_vh
+    return out_mean, out_incr, out_min, out_max
+
+
+def stack(size, dates, seed=0):
+    """Return synthetic stack of linear gamma0 with nodata, pixels below -29 dB and infinite values"""
+    rng = np.random.default_rng(seed)
+    vh = np.empty((size, size, dates), dtype=np.float32)
+    for t in range(dates):
+        vh[:, :, t] = rng.gamma(4.4, 0.05 / 4.4, (size, size))
+    vh[rng.random(vh.shape) < 0.05] = -999
+    vh[rng.random(vh.shape) < 0.05] = 0.001
+    vh[rng.random(vh.shape) < 0.001] = np.inf
+    time_0 = np.cumsum(rng.integers(6, 13, dates)).astype(np.float64)
+    return vh, time_0
+
+
+def chunks(kernel, vh, time_0, pool, lines):
+    lines = list(range(0, vh.shape[0], lines)) + [vh.shape[0]]
+    results = pool.starmap(kernel, [(vh[lines[i]:lines[i+1]], time_0) for i in range(len(lines) - 1)])
+    return tuple(np.concatenate([r[k] for r in results]) for k in range(4))
+
+
+def run(kernel, vh, time_0, block):
+    size = vh.shape[0]
+    outputs = tuple(np.zeros((size, size), dtype=np.float32) for _ in range(4))
+    for y in range(0, size, block):
+        for x in range(0, size, block):
+            r = kernel(vh[y:y + block, x:x + block], time_0)
+            for output, result in zip(outputs, r):
+                output[y:y + block, x:x + block] = result
+    return outputs
+
+
+def main(size=4096, dates=60, block=4096):
+    threads = min(max(4, cpu_count() // 2), numba.config.NUMBA_NUM_THREADS)
+    numba.set_num_threads(threads)
+    vh, time_0 = stack(size, dates)
+    print(f'stack {size}x{size} px x {dates} dates ({vh.nbytes / 1e9:.1f} GB), blocks of {block} px, {threads} threads')
+    with ThreadPool(threads) as pool:
+        kernels = [('reference', lambda v, t: chunks(reference_statistics, v, t, pool, -(-v.shape[0] // threads))),
+                   ('serial', ricemap.global_statistics),
+                   ('parallel', ricemap.global_statistics_parallel),
+                   ('numpy', lambda v, t: chunks(ricemap.global_statistics_numpy, v, t, pool,
+                                                 ricemap.NUMPY_CHUNK_LINES))]
+        expected = None
+        for name, kernel in kernels:
+            # compilation is excluded from measurement
+            kernel(vh[:16, :16], time_0)
+            start = time.perf_counter()
+            outputs = run(kernel, vh, time_0, block)
+            elapsed = time.perf_counter() - start
+            expected = expected or outputs
+            identical = all(np.array_equal(a.view(np.uint32), b.view(np.uint32)) for a, b in zip(expected, outputs))
+            print(f'{name:>10}: {elapsed:6.2f} s => {size * size / 1e6 / elapsed:5.2f} Mpx/s, '
+                  f'bit-identical: {identical}')
+            assert identical, f'outputs of {name} kernel differ from reference'
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:4]))
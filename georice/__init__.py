@@ -3,17 +3,18 @@
 from .imagery import GetSentinel, Geometry
 from .ricemap import Ricemap
 from .filtering import Filtering
-from .utils import load_config, show_config, save_config, set_sh, Dir, mosaic
+from .utils import Config, show_config, save_config, set_sh, Dir, mosaic
+from .download import DownloadJournal
 import os
 
 class Georice:
 
     def __init__(self):
-        self.config = load_config()
+        self.config = Config.load()
         self._path_check()
-        self._imagery = GetSentinel()
-        self._ricemap = Ricemap()
-        self._filtering = Filtering()
+        self._imagery = GetSentinel(self.config)
+        self._ricemap = Ricemap(self.config)
+        self._filtering = Filtering(self.config)
 
         self._get_tile_attr()
 
@@ -21,7 +22,6 @@ class Georice:
         if self.config['output'] == 'default':
             home = os.getcwd()
             self.set_config(output=os.path.join(home, 'output'))
-            self.config = load_config()
 
     def _get_tile_attr(self):
         try:
@@ -31,12 +31,13 @@ class Georice:
             output = os.scandir(self.config['output'])
 
         for file in output:
-            if file.is_dir():
+            if file.is_dir() and not file.name.startswith('.'):
                 setattr(self, file.name, Dir(file.path))
 
     def tiles(self):
         """Return list of tiles"""
-        return [file.name for file in os.scandir(self.config['output']) if file.is_dir()]
+        return [file.name for file in os.scandir(self.config['output'])
+                if file.is_dir() and not file.name.startswith('.')]
 
     def set_credentials(self, **kwargs):
         """
@@ -52,7 +53,21 @@ class Georice:
                 set_sh(key, kwargs[key])
             else:
                 raise Exception(f'Key: {key} was not in expected keys  (sh_client_id, sh_client_secret, instance_id)')
-        self._imagery = GetSentinel()
+        self._imagery = GetSentinel(self.config)
+
+    def reload_config(self):
+        """
+        Take new snapshot of config file if the file was modified since the last one and pass it to all processors.
+        The snapshot is taken at the start of every run, so edits of config file during a run are not seen.
+        """
+        if self.config.changed():
+            self._use_config(self.config.reload())
+
+    def _use_config(self, config):
+        self.config = config
+        for processor in ['_imagery', '_ricemap', '_filtering']:
+            if hasattr(self, processor):
+                getattr(self, processor).set_config(config)
 
     def set_config(self, **kwargs: dict):
         """Save setting of config file
@@ -76,9 +91,36 @@ class Georice:
         ram_per_process - parameter of SAR MultiTempFilter, define RAM used for a processing; type: int; default = 4096;
         OTBThreads - parameter of SAR MultiTempFilter, number of threads; type: int; default = 4;
         Window_radius - parameter of SAR MultiTempFilter; type: int; default = 2;
+        max_workers - number of tiles downloaded in parallel; type: int; default = 8;
+        max_retries - number of retries of failed tile request; type: int; default = 3;
+        retry_backoff - delay in seconds before first retry, doubled for every next retry; type: float; default = 1.0;
+        multiband_request - request all polarizations of a tile at once; type: bool; default = True;
+        data_mask - request dataMask band and set pixels without data to nodata instead of rasterization
+        of scene footprint; type: bool; default = True;
+        cache - keep downloaded tiles in cache folder output/.cache; type: bool; default = True;
+        cache_size - disk budget of tile cache in bytes; type: float; default = 1E10;
+        catalog - keep found scenes in local catalog output/.catalog.sqlite and search only time not searched yet;
+        type: bool; default = True;
+        block_size - size of square blocks of downloaded scene files in pixels, should divide processing block
+        of ricemap (4096); type: int; default = 1024;
+        compress - codec of downloaded scene files; type: str; values deflate, zstd, lerc; default = 'deflate';
+        overviews - build internal overviews of downloaded scene files; type: bool; default = False;
+        storage - format of downloaded scene files; type: str; values float32 - linear gamma0, uint16 - gamma0 in dB
+        quantized with max. error 0.0006 dB, float16 - gamma0 in dB with max. error 0.016 dB; quantized scenes
+        can not be filtered by SAR multi-temporal speckle filter; default = 'float32';
+        cube - append downloaded scenes into temporal cubes in folder output/tile/cube, ricemap reads time series
+        of a block from the cube at once when the scenes are not filtered; type: bool; default = False;
+        cube_chunk_size - size of square chunks of temporal cube in pixels, should be equal to processing block
+        of ricemap; type: int; default = 4096;
+        engine - engine of temporal statistics of ricemap; type: str; values numba - compiled kernel, numpy - numpy
+        reductions for platforms without numba, None - numba if it is installed, numpy otherwise; default = None;
+        out_of_core - keep full raster statistics and rice map of ricemap in memory-mapped scratch files instead of
+        memory; type: bool; default = False;
+        max_memory_gb - memory budget of ricemap in GB, sets size of processed blocks, 0 - 80% of memory available
+        at start; type: float; default = 0;
         """
         save_config(kwargs)
-        self.config = load_config()
+        self._use_config(Config.load())
 
     @staticmethod
     def show_config():
@@ -103,6 +145,33 @@ class Georice:
         ram_per_process - parameter of SAR MultiTempFilter, define RAM used for a processing; type: int; default = 4096;
         OTBThreads - parameter of SAR MultiTempFilter, number of threads; type: int; default = 4;
         Window_radius - parameter of SAR MultiTempFilter; type: int; default = 2;
+        max_workers - number of tiles downloaded in parallel; type: int; default = 8;
+        max_retries - number of retries of failed tile request; type: int; default = 3;
+        retry_backoff - delay in seconds before first retry, doubled for every next retry; type: float; default = 1.0;
+        multiband_request - request all polarizations of a tile at once; type: bool; default = True;
+        data_mask - request dataMask band and set pixels without data to nodata instead of rasterization
+        of scene footprint; type: bool; default = True;
+        cache - keep downloaded tiles in cache folder output/.cache; type: bool; default = True;
+        cache_size - disk budget of tile cache in bytes; type: float; default = 1E10;
+        catalog - keep found scenes in local catalog output/.catalog.sqlite and search only time not searched yet;
+        type: bool; default = True;
+        block_size - size of square blocks of downloaded scene files in pixels, should divide processing block
+        of ricemap (4096); type: int; default = 1024;
+        compress - codec of downloaded scene files; type: str; values deflate, zstd, lerc; default = 'deflate';
+        overviews - build internal overviews of downloaded scene files; type: bool; default = False;
+        storage - format of downloaded scene files; type: str; values float32 - linear gamma0, uint16 - gamma0 in dB
+        quantized with max. error 0.0006 dB, float16 - gamma0 in dB with max. error 0.016 dB; quantized scenes
+        can not be filtered by SAR multi-temporal speckle filter; default = 'float32';
+        cube - append downloaded scenes into temporal cubes in folder output/tile/cube, ricemap reads time series
+        of a block from the cube at once when the scenes are not filtered; type: bool; default = False;
+        cube_chunk_size - size of square chunks of temporal cube in pixels, should be equal to processing block
+        of ricemap; type: int; default = 4096;
+        engine - engine of temporal statistics of ricemap; type: str; values numba - compiled kernel, numpy - numpy
+        reductions for platforms without numba, None - numba if it is installed, numpy otherwise; default = None;
+        out_of_core - keep full raster statistics and rice map of ricemap in memory-mapped scratch files instead of
+        memory; type: bool; default = False;
+        max_memory_gb - memory budget of ricemap in GB, sets size of processed blocks, 0 - 80% of memory available
+        at start; type: float; default = 0;
         """
         show_config()
 
@@ -114,6 +183,7 @@ class Georice:
         :param period: tuple (str, str). date format YYYYMMDD
         :param info: bool, turn off/on writing down list of found scenes
         """
+        self.reload_config()
         self._imagery.search(bbox, epsg, period)
         if info:
             self.scenes()
@@ -138,10 +208,34 @@ class Georice:
         :param name: Name of the tile
         :return:
         """
-        self._imagery.download(name)
+        self.reload_config()
+        journal = self._journal(name, task='scenes')
+        self._imagery.download(name, journal=journal)
+        journal.clear()
         print(f'Scenes were downloaded into {self.config["output"]}/{name}/scenes')
         self._get_tile_attr()
 
+    def _journal(self, name, **job):
+        """
+        Return download journal of the tile started for job given by keyword arguments, found scenes and storage
+        settings. Every kind of job (keyword task) has its own journal. Journal of an interrupted run of another job
+        of the same kind is discarded together with rice maps of its parts.
+        """
+        imagery = self._imagery
+        job.update(aoi=list(imagery.aoi.geometry.bounds) if imagery.aoi is not None else None,
+                   search=[date.strftime('%Y%m%d') for date in imagery.period],
+                   scenes=[str(scene) for scene in imagery._scenes],
+                   **{key: self.config.get(key) for key in ['resolution', 'storage', 'compress', 'block_size',
+                                                              'data_mask', 'polar_modes']})
+        journal = DownloadJournal.of_tile(os.path.join(self.config['output'], name), job['task'])
+        journal.start(job)
+        ricemaps = os.path.join(self.config['output'], name, 'ricemaps')
+        if journal.stale_parts and os.path.isdir(ricemaps):
+            for entry in os.scandir(ricemaps):
+                if any(f'_{part}' in entry.name for part in journal.stale_parts):
+                    os.remove(entry.path)
+        return journal
+
     def get_ricemap(self, name, period, orbit_path=None, orbit_number=None, inter=False, lzw=False, mask=False, nr=False,
                     filtering=True, delete=True):
         """
@@ -159,12 +253,24 @@ class Georice:
         nr - diable automatic reprojection to EPSG:4326, type: bool; default = True
         filtering - Use SAR multi-temporal speckle filter; default = True
         delete - delete partial ricemaps; default = True
+
+        Progress is recorded in the download journal of the tile. If the previous run of the same parameters was
+        interrupted, downloaded scenes and processed parts are not processed again. Journal of a run of other
+        parameters is discarded.
         """
+        self.reload_config()
+        if filtering and self._imagery.storage.quantized:
+            raise Exception(f'Scenes stored as {self._imagery.storage.format} can not be filtered, '
+                            f'set config key storage to float32 or disable filtering')
         self.filter(inplace=True, rel_orbit_num=orbit_number, orbit_path=orbit_path)
-        if hasattr(self, name) and hasattr(self.__getattribute__(name), 'scenes'):
+        journal = self._journal(name, task='ricemap', period=list(period), orbit_path=orbit_path,
+                                orbit_number=orbit_number, inter=inter, lzw=lzw, mask=mask, nr=nr, filtering=filtering)
+        if journal.resumed:
+            print('Resuming interrupted processing of the tile')
+        elif hasattr(self, name) and hasattr(self.__getattribute__(name), 'scenes'):
             self.__getattribute__(name).scenes.delete()
 
-        if self._imagery.aoi.geometry.area >= load_config().get('max_area'):
+        if self._imagery.aoi.geometry.area >= self.config.get('max_area'):
             geom = Geometry(self._imagery.aoi.geometry, self._imagery.aoi.crs, grid_leght=(10000, 10000))
             copy = self._imagery.__copy__()
 
@@ -172,11 +278,14 @@ class Georice:
             n_parts = sum(1 for dummy in iter(geom))
 
             for id, sub_aoi in enumerate(iter(geom)):
-                print(f'Starting to process part {id+1}/{n_parts}')
                 part = f'part{id}-'
+                if journal.part_done(part):
+                    print(f'Part {id+1}/{n_parts} was already processed')
+                    continue
+                print(f'Starting to process part {id+1}/{n_parts}')
                 grid = Geometry(sub_aoi[0], self._imagery.aoi.crs)
                 copy.aoi = grid
-                copy.download(tile_name=name, part=part)
+                copy.download(tile_name=name, part=part, journal=journal)
                 if filtering:
                     self._filtering.process(name, orbit_path)
                     self._ricemap.ricemap_get(name, orbit_number, period, orbit_path, inter, lzw, mask, nr, part=part,
@@ -185,11 +294,13 @@ class Georice:
                     self._ricemap.ricemap_get(name, orbit_number, period, orbit_path, inter, lzw, mask, nr, part=part)
                 self._get_tile_attr()
                 self.__getattribute__(name).scenes.delete()
+                journal.complete_part(part)
             print(f'')
             mosaic(self.__getattribute__(name).ricemaps.file_paths(), delete=delete)
+            journal.clear()
         else:
             print('Downloading scenes')
-            self._imagery.download(tile_name=name)
+            self._imagery.download(tile_name=name, journal=journal)
             print('Downloading finished')
             if filtering:
                 self._filtering.process(name, orbit_path)
@@ -199,6 +310,7 @@ class Georice:
                 self._ricemap.ricemap_get(name, orbit_number, period, orbit_path, inter, lzw, mask, nr)
             self._get_tile_attr()
             self.__getattribute__(name).scenes.delete()
+            journal.clear()
             print(f'Rice map was downloaded into {self.config["output"]}{os.sep}{name}{os.sep}ricemaps')
 
 
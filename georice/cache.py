@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+from threading import Lock
+import numpy
+
+
+class TileCache:
+    """
+    Content addressed on-disk cache of Sentinel Hub tile responses. Entries are numpy files named by hash of the
+    request parameters. The least recently used entries are evicted when the size of cache exceeds the disk budget.
+    """
+
+    def __init__(self, path, max_size=10e9):
+        """
+        :param path: str, cache folder
+        :param max_size: float, disk budget of cache in bytes
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def __deepcopy__(self, memo):
+        # copies of GetSentinel share one cache and its counters
+        return self
+
+    @staticmethod
+    def key(**params):
+        """Return key of request given by keyword parameters, parameters have to be json serializable"""
+        return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        """Return cached array or None"""
+        path = self._path(key)
+        try:
+            array = numpy.load(path, allow_pickle=False)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += array.nbytes
+        return array
+
+    def put(self, key, array):
+        """Save array into cache, then evict least recently used entries over the disk budget"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            numpy.save(file, array, allow_pickle=False)
+        size = os.path.getsize(tmp)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp, path)
+            self._size += size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self.max_size:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def _entries(self):
+        for folder in os.scandir(self.path):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.is_file() and entry.name.endswith('.npy'):
+                        yield entry
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], key + '.npy')
+
+    def clear(self):
+        """Remove all entries of cache"""
+        with self._lock:
+            for entry in list(self._entries()):
+                os.remove(entry.path)
+            self._size = 0
+
+    def stats(self):
+        """Return dictionary with cache hits, misses, bytes saved and actual size of cache in bytes"""
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved, 'size': self._size}
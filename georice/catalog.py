@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+
+class SceneCatalog:
+    """
+    Local SQLite catalog of WFS features found for AOI. For every AOI it remembers searched time range and time of
+    the last refresh, so repeated search queries Sentinel Hub only for time not covered yet.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str, path of SQLite database file
+        """
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS searches '
+                         '(aoi TEXT PRIMARY KEY, start TEXT, end TEXT, refreshed TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS features '
+                         '(aoi TEXT, id TEXT, time TEXT, feature TEXT, PRIMARY KEY (aoi, id))')
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return sqlite3.connect(self.path)
+
+    @staticmethod
+    def aoi_key(aoi):
+        """Return key of AOI given by its crs and bbox"""
+        return f'{aoi.crs.to_epsg()}:' + ','.join(f'{coor:.3f}' for coor in aoi.bbox)
+
+    def coverage(self, aoi):
+        """Return (start, end, refreshed) of time range already searched for AOI or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT start, end, refreshed FROM searches WHERE aoi = ?',
+                               (self.aoi_key(aoi),)).fetchone()
+        if row is None:
+            return None
+        return tuple(datetime.fromisoformat(value) for value in row)
+
+    def missing(self, aoi, period):
+        """
+        Return list of time ranges of period, which have to be searched in the archive. Time after the last refresh
+        is never considered as covered.
+        :param aoi: Geometry
+        :param period: list [start, end] of datetime
+        """
+        start, end = period
+        coverage = self.coverage(aoi)
+        if coverage is None:
+            return [(start, end)]
+        covered_start, covered_end, _ = coverage
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start))
+        if end > covered_end:
+            ranges.append((covered_end, end))
+        return ranges
+
+    def update(self, aoi, searched, features, now=None):
+        """
+        Save features found for AOI and extend its searched time range
+        :param aoi: Geometry
+        :param searched: list of searched time ranges (start, end)
+        :param features: list of WFS geojson features
+        :param now: datetime of refresh, default actual time
+        """
+        now = now or datetime.utcnow()
+        key = self.aoi_key(aoi)
+        coverage = self.coverage(aoi)
+        starts = [start for start, _ in searched] + ([coverage[0]] if coverage else [])
+        # time after the refresh may still get new acquisitions, so it is not marked as covered
+        ends = [min(end, now) for _, end in searched] + ([coverage[1]] if coverage else [])
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)',
+                             [(key, feature['properties']['id'], self._feature_time(feature), json.dumps(feature))
+                              for feature in features])
+            conn.execute('INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)',
+                         (key, min(starts).isoformat(), max(ends).isoformat(), now.isoformat()))
+
+    def features(self, aoi, period):
+        """Return list of cached WFS features of AOI acquired within period"""
+        start, end = period
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT feature FROM features WHERE aoi = ? AND time >= ? AND time <= ? ORDER BY time',
+                                (self.aoi_key(aoi), start.isoformat(), end.isoformat())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @staticmethod
+    def _feature_time(feature):
+        from_time = feature['properties']['id'].split('_')[4]
+        return datetime.strptime(from_time, '%Y%m%dT%H%M%S').isoformat()
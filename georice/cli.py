@@ -3,9 +3,9 @@
 import click
 import json
 import os
-import subprocess
 
 from georice.utils import set_sh, show_sh, load_config, show_config
+from georice.engine import RicemapJob, run
 
 
 @click.group()
@@ -66,7 +66,8 @@ def set_config(key, value):
     """Save selected parameters of georice config file"""
     config_file = os.path.join(os.path.dirname(__file__), 'config.json')
     config = load_config()
-    config.update({key: type(config[key])(value)})
+    # keys without value in config file (null), e.g. engine, are saved as given
+    config.update({key: type(config[key])(value) if config[key] is not None else value})
     with open(config_file, 'w') as cfg_file:
         json.dump(config, cfg_file, indent=2)
 
@@ -114,7 +115,8 @@ def ricemap(tile, a):
     Tile - tile name used for downolad of scenes
     """
     if a:
-        scene_path = os.path.join(load_config()['output'], tile, 'scenes')
+        config = load_config()
+        scene_path = os.path.join(config['output'], tile, 'scenes')
         period, orb_num, orbit_path = set(), set(), set()
         with os.scandir(scene_path) as files:
             for file in files:
@@ -125,11 +127,11 @@ def ricemap(tile, a):
                     orbit_path.add(parsed[3])
         for orbit in orbit_path:
             for num in orb_num:
-                command = ['ricemap.py', scene_path, num, min(period), max(period),
-                           config['output'], '-d', orbit]
-                subprocess.run(' '.join(command), shell=True)
+                run(RicemapJob(scene_path, num, min(period), max(period), config['output'], direction=orbit,
+                               engine=config.get('engine'), out_of_core=config.get('out_of_core', False),
+                               max_memory_gb=config.get('max_memory_gb', 0)))
                 click.echo(f'Ricemap for orbit path/orbit number/period: {orbit}/{num}/{min(period)}/{max(period)} '
-                           f'saved at folder: {os.path.join(load_config()["output"], tile)}')
+                           f'saved at folder: {os.path.join(config["output"], tile)}')
 
 
 @ricemap.command('get')
@@ -152,17 +154,10 @@ def get(orbit_number, starting_date, ending_date, tile, orbit_path, inter, lzw,
     Generate rice map for specyfic parameters.
     NOTE: starting_date / ending_date => YYYYMMDD, inclusive
     """
-    scene_path = os.path.join(load_config()['output'], tile, 'scenes')
-    command = ['ricemap.py', scene_path, orbit_number, starting_date, ending_date, load_config()['output']]
-    if orbit_path:
-        command.append('-d ' + orbit_path)
-    if inter:
-        command.append('-i')
-    if lzw:
-        command.append('-lzw')
-    if mask:
-        command.append('-m')
-    if nr:
-        command.append('-nr')
-    subprocess.run(' '.join(command), shell=True)
-    click.echo(f'Rice map saved into folder: {os.path.join(load_config()["output"], tile)}')
+    config = load_config()
+    scene_path = os.path.join(config['output'], tile, 'scenes')
+    run(RicemapJob(scene_path, orbit_number, starting_date, ending_date, config['output'],
+                   direction=orbit_path or 'DES', intermediate=inter, lzw=lzw, masks=mask, reproject=not nr,
+                   engine=config.get('engine'), out_of_core=config.get('out_of_core', False),
+                   max_memory_gb=config.get('max_memory_gb', 0)))
+    click.echo(f'Rice map saved into folder: {os.path.join(config["output"], tile)}')
@@ -0,0 +1,160 @@
+import json
+import os
+import tempfile
+import numpy
+from rasterio import open as raster_open
+from rasterio.crs import CRS
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from .storage import SceneStorage
+
+
+class SceneCube:
+    """
+    Temporal cube of scenes of one tile, orbit path, relative orbit and polarization. Space is split into square
+    chunks, every chunk is a raw binary file with frames of all dates stored one after another, so the time series of
+    a window is read from a few files mapped into memory. Values are kept in storage format of scenes.
+
+    Chunks are frame-major (frames, rows, cols) on purpose: a scene is appended by one sequential write per chunk,
+    while in time-innermost chunks (rows, cols, frames) every appended frame is scattered over the whole chunk file.
+    The time series of a window is gathered by bands of READ_ROWS rows of all frames. In benchmarks/cube.py quantized
+    scenes are read about as fast as from time-innermost chunks and float32 ones up to 3 times slower, while appending
+    is 3 to 7 times faster.
+
+    Metadata and names of scenes of frames are kept in cube.json, which is replaced atomically after frames were
+    written. Frames beyond the scenes of cube.json are left by interrupted append and they are overwritten by the next
+    one.
+    """
+    READ_ROWS = 8
+
+    def __init__(self, path):
+        """
+        :param path: str, folder of cube
+        """
+        self.path = path
+        self.meta = None
+        if os.path.isfile(self._meta_path):
+            with open(self._meta_path) as file:
+                self.meta = json.load(file)
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.path, 'cube.json')
+
+    def exists(self):
+        return self.meta is not None
+
+    @property
+    def names(self):
+        """Names of scene files of frames in order of frames"""
+        return list(self.meta['names']) if self.meta else []
+
+    @property
+    def shape(self):
+        return self.meta['height'], self.meta['width']
+
+    @property
+    def chunk_size(self):
+        return self.meta['chunk_size']
+
+    @property
+    def transform(self):
+        return Affine(*self.meta['transform'])
+
+    @property
+    def crs(self):
+        return self.meta['crs']
+
+    @property
+    def storage(self):
+        return SceneStorage(self.meta['storage'], self.meta['nodata'])
+
+    @property
+    def dtype(self):
+        # float16 is stored natively, GDAL keeps it as float32
+        return numpy.dtype('float16' if self.meta['storage'] == 'float16' else self.storage.profile()['dtype'])
+
+    def create(self, height, width, transform, crs, storage, chunk_size=4096):
+        """
+        Create empty cube
+        :param height: int, height of scenes in pixels
+        :param width: int, width of scenes in pixels
+        :param transform: Affine, transform of scenes
+        :param crs: str, crs of scenes
+        :param storage: SceneStorage, storage format of scenes
+        :param chunk_size: int, size of square chunk in pixels
+        """
+        os.makedirs(self.path, exist_ok=True)
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.bin'):
+                os.remove(entry.path)
+        self.meta = {'height': height, 'width': width, 'crs': CRS.from_user_input(crs).to_wkt(),
+                     'transform': [transform.a, transform.b, transform.c, transform.d, transform.e, transform.f],
+                     'storage': storage.format, 'nodata': storage.nodata, 'chunk_size': chunk_size, 'names': []}
+        self._save_meta()
+
+    def _save_meta(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self._meta_path)
+
+    def chunks(self, window=None):
+        """Yield (chunk path, chunk window) of chunks intersecting window, default all chunks"""
+        height, width = self.shape
+        size = self.meta['chunk_size']
+        window = window or Window(0, 0, width, height)
+        for row in range(int(window.row_off) // size, (int(window.row_off + window.height) - 1) // size + 1):
+            for col in range(int(window.col_off) // size, (int(window.col_off + window.width) - 1) // size + 1):
+                chunk = Window(col * size, row * size, min(size, width - col * size), min(size, height - row * size))
+                yield os.path.join(self.path, f'r{row}_c{col}.bin'), chunk
+
+    def append(self, path):
+        """
+        Append scene file as a new frame of cube, frame of scene of the same name is replaced
+        :param path: str, path of scene file in storage format of cube
+        """
+        name = os.path.basename(path)
+        if not self.exists():
+            raise Exception(f'Cube {self.path} does not exist')
+        with raster_open(path) as dataset:
+            if (dataset.height, dataset.width) != self.shape or dataset.transform != self.transform:
+                raise Exception(f'Scene {name} does not match grid of cube {self.path}')
+            names = self.names
+            index = names.index(name) if name in names else len(names)
+            for chunk_path, chunk in self.chunks():
+                frame = dataset.read(1, window=chunk).astype(self.dtype)
+                with open(chunk_path, 'r+b' if os.path.exists(chunk_path) else 'wb') as file:
+                    file.seek(index * frame.nbytes)
+                    file.write(frame.tobytes())
+        if index == len(names):
+            self.meta['names'].append(name)
+        self._save_meta()
+
+    def read(self, window, frames=None, out=None):
+        """
+        Return time series of window decoded into linear gamma0 as array (height, width, frame). Only rows and columns
+        of window are read from chunk files, by bands of READ_ROWS rows of all frames, so memory does not depend on
+        chunk size.
+        :param window: rasterio Window
+        :param frames: list of indices of frames, default all frames
+        :param out: array (height, width, frame) of window to write time series into, default new array
+        """
+        frames = list(range(len(self.names))) if frames is None else list(frames)
+        storage = self.storage
+        x0, y0 = int(window.col_off), int(window.row_off)
+        series = numpy.empty((int(window.height), int(window.width), len(frames)), dtype='float32') if out is None else out
+        for chunk_path, chunk in self.chunks(window):
+            data = numpy.memmap(chunk_path, dtype=self.dtype, mode='r').reshape(-1, chunk.height, chunk.width)
+            rows = slice(max(y0, chunk.row_off), min(y0 + window.height, chunk.row_off + chunk.height))
+            cols = slice(max(x0, chunk.col_off), min(x0 + window.width, chunk.col_off + chunk.width))
+            for y in range(rows.start, rows.stop, self.READ_ROWS):
+                band = slice(y, min(y + self.READ_ROWS, rows.stop))
+                block = data[frames, band.start - chunk.row_off:band.stop - chunk.row_off,
+                             cols.start - chunk.col_off:cols.stop - chunk.col_off]
+                series[band.start - y0:band.stop - y0, cols.start - x0:cols.stop - x0] = \
+                    storage.decode(block.transpose(1, 2, 0))
+            del data
+        return series
@@ -0,0 +1,245 @@
+import concurrent.futures
+import json
+import os
+import time
+import zlib
+from threading import Lock
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+FULL, PARTIAL, EMPTY = 'full', 'partial', 'empty'
+
+
+class DownloadPlan:
+    """
+    Classification of AOI grid cells against scene footprints, made before any request is sent. Grid cells are
+    indexed once per AOI by STRtree, footprints are tested as prepared geometries.
+    """
+
+    def __init__(self, grid):
+        """
+        :param grid: list of grid cells (bbox, shape) as yielded by Geometry.iter()
+        """
+        self.grid = grid
+        self._cells = [bbox for bbox, _ in grid]
+        self._tree = STRtree(self._cells)
+        self._ids = {id(cell): index for index, cell in enumerate(self._cells)}
+
+    def classify(self, footprint):
+        """
+        Return state of every grid cell for given footprint
+        :param footprint: shapely geometry of scene
+        :return: list of FULL, PARTIAL or EMPTY
+        """
+        prepared = prep(footprint)
+        states = [EMPTY] * len(self._cells)
+        for index in self._query(footprint):
+            cell = self._cells[index]
+            if prepared.contains(cell):
+                states[index] = FULL
+            elif prepared.intersects(cell):
+                states[index] = PARTIAL
+        return states
+
+    def _query(self, geometry):
+        # shapely < 2.0 returns geometries, shapely >= 2.0 returns indices
+        return [self._ids[id(hit)] if isinstance(hit, BaseGeometry) else int(hit)
+                for hit in self._tree.query(geometry)]
+
+
+class DownloadScheduler:
+    """
+    Run download jobs concurrently under a global concurrency limit. Failed jobs are retried with exponential
+    backoff and the latency of every finished job is recorded.
+    """
+
+    def __init__(self, max_workers=8, max_retries=3, backoff=1.0):
+        """
+        :param max_workers: int, maximal number of jobs running at the same time
+        :param max_retries: int, number of retries of a failed job before the error is raised
+        :param backoff: float, delay in seconds before the first retry, doubled with every next retry
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = backoff
+        self.latency = []
+        self._lock = Lock()
+
+    def run(self, function, jobs, callback=None):
+        """
+        Call function(*job) for every job. Results are passed to callback(job, result) in the calling thread as soon
+        as they are available, so the caller never holds more results than it wants to.
+        :param function: callable executed in worker threads
+        :param jobs: list of tuples with positional arguments of function
+        :param callback: callable, if None, list of results in order of jobs is returned
+        :return: list of results or None
+        """
+        results = [None] * len(jobs) if callback is None else None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._execute, function, job): index for index, job in enumerate(jobs)}
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    # drop the reference, so result can be released as soon as callback is done with it
+                    index = futures.pop(future)
+                    if callback is None:
+                        results[index] = future.result()
+                    else:
+                        callback(jobs[index], future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    def _execute(self, function, job):
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                result = function(*job)
+                break
+            except Exception as error:
+                if attempt >= self.max_retries:
+                    raise Exception(f'Download job failed after {attempt + 1} attempts. Reason: {error}') from error
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+        with self._lock:
+            self.latency.append((time.perf_counter() - start, attempt + 1))
+        return result
+
+    def reset(self):
+        self.latency = []
+
+    def report(self):
+        """Return dictionary with number of finished jobs, retries and latency percentiles in seconds"""
+        with self._lock:
+            latency = sorted(seconds for seconds, _ in self.latency)
+            retries = sum(attempts - 1 for _, attempts in self.latency)
+        if len(latency) == 0:
+            return {'jobs': 0, 'retries': 0}
+
+        def percentile(p):
+            return latency[min(len(latency) - 1, int(round(p / 100 * (len(latency) - 1))))]
+
+        return {'jobs': len(latency), 'retries': retries, 'mean': sum(latency) / len(latency),
+                'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99), 'max': latency[-1]}
+
+    def show_report(self):
+        report = self.report()
+        if report['jobs'] == 0:
+            print('No tile was downloaded')
+        else:
+            print(f'{report["jobs"]} tiles downloaded ({report["retries"]} retries), tile latency: '
+                  f'mean {report["mean"]:.2f}s, p50 {report["p50"]:.2f}s, p95 {report["p95"]:.2f}s, '
+                  f'max {report["max"]:.2f}s')
+
+
+class DownloadJournal:
+    """
+    Append-only journal of completed download units of a tile: scene files verified by size and checksum and
+    processed AOI parts. Every record is a single json line flushed to disk, a torn last line left by a crash is
+    ignored on load. Journal is kept next to the outputs, so an interrupted run can be resumed.
+
+    The first record holds parameters of the job, a journal of another job is discarded by start. Every kind of job
+    of a tile has its own journal, so e.g. downloading of scenes does not discard an interrupted rice map.
+
+    Checksum of a scene file is CRC32 of its first and last 64 kB only, together with the size it detects truncated
+    or replaced files without reading whole scenes.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str, path of journal file
+        """
+        self.path = path
+        self.job = None
+        self.files = {}
+        self.parts = set()
+        self.stale_parts = set()
+        self.resumed = False
+        if os.path.isfile(path):
+            with open(path) as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('unit') == 'job':
+                        self.job = record['job']
+                    elif record.get('unit') == 'file':
+                        self.files[record['name']] = record
+                    elif record.get('unit') == 'part':
+                        self.parts.add(record['part'])
+
+    @classmethod
+    def of_tile(cls, folder, task):
+        """Return journal of given kind of job of tile folder"""
+        return cls(os.path.join(folder, f'.journal_{task}'))
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def start(self, job):
+        """
+        Start journal of job or resume it. Journal of an interrupted run of another job is discarded, its processed
+        parts are kept in stale_parts. Result is kept in resumed.
+        :param job: dict, json serializable parameters of job
+        :return: bool, True if interrupted run of the same job is resumed
+        """
+        job = json.loads(json.dumps(job))
+        self.stale_parts = set()
+        self.resumed = self.exists() and self.job == job
+        if self.resumed:
+            return True
+        if self.exists():
+            self.stale_parts = set(self.parts)
+            self.clear()
+        self.job = job
+        self._append({'unit': 'job', 'job': job})
+        return False
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as journal:
+            journal.write(json.dumps(record) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    @staticmethod
+    def checksum(path, sample=1 << 16):
+        with open(path, 'rb') as file:
+            digest = zlib.crc32(file.read(sample))
+            size = os.fstat(file.fileno()).st_size
+            if size > sample:
+                file.seek(max(sample, size - sample))
+                digest = zlib.crc32(file.read(), digest)
+        return digest
+
+    def complete_file(self, path):
+        """Record scene file as completely written"""
+        record = {'unit': 'file', 'name': os.path.basename(path), 'size': os.path.getsize(path),
+                  'crc32': self.checksum(path)}
+        self.files[record['name']] = record
+        self._append(record)
+
+    def file_done(self, path):
+        """Return True if file was recorded as completed and it was not changed since"""
+        record = self.files.get(os.path.basename(path))
+        if record is None or not os.path.isfile(path) or os.path.getsize(path) != record['size']:
+            return False
+        return self.checksum(path) == record.get('crc32')
+
+    def complete_part(self, part):
+        """Record AOI part as processed"""
+        self.parts.add(part)
+        self._append({'unit': 'part', 'part': part})
+
+    def part_done(self, part):
+        return part in self.parts
+
+    def clear(self):
+        """Remove journal after the whole run is finished"""
+        if self.exists():
+            os.remove(self.path)
+        self.job, self.files, self.parts = None, {}, set()
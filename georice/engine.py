@@ -0,0 +1,1205 @@
+import os
+import datetime as dt
+import numpy as np
+import rasterio as rio
+import time
+import math
+import psutil
+import gc
+import shutil
+import tempfile
+
+from functools import lru_cache
+from osgeo import gdal, gdal_array, osr
+from rasterio.windows import Window
+from scipy import ndimage
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from threading import Thread, Event
+from queue import Queue, Empty, Full
+from platform import system
+from .cube import SceneCube
+from .storage import SceneStorage
+
+try:
+    import numba
+except ImportError:
+    # numpy engine only
+    numba = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# georice related constants
+
+# Threshold values for rice mapping classification
+RICE_THRESHOLD_DB = 5.
+urban_trees_threshold_dB = -18.
+water_threshold_dB = -18.
+
+# Objects and holes smaller than these thresholds (pixels) are removed from classes of rice map
+OBJECTS_THRESHOLD = 20
+HOLES_THRESHOLD = 20
+
+# Halo of blocks of rice map (pixels)
+# => a component reaching farther than its threshold from a pixel is not small, so the removal of small objects is exact
+#    at OBJECTS_THRESHOLD + 1 pixels from the border of a block with halo, the filling of small holes of its result
+#    HOLES_THRESHOLD + 1 pixels farther
+RICE_MAPPING_HALO = OBJECTS_THRESHOLD + HOLES_THRESHOLD + 2
+
+# ----------------------------------------------------------------------------------------------------------------------
+# data processing tweaks
+
+# Block size when writing geotiff:
+# - HAS TO BE a multiple of 16 (WARNING: no checks done, bad values will raise a gdal error)
+TIFF_BLOCK_SIZE = 1024
+
+# Maximum block size to be processed at once
+# => input rasters data will be processed in chunks of BLOCK_SIZE x BLOCK_SIZE pixels at most
+# => the block size is lowered by steps of MIN_BLOCK_SIZE to fit the memory budget (MAX_MEMORY_GB), so large
+#    timescales are processed by smaller blocks
+BLOCK_SIZE = TIFF_BLOCK_SIZE * 4
+MIN_BLOCK_SIZE = 256
+
+# Memory budget of processing (GB)
+# => 0: 80% of memory available at start
+MAX_MEMORY_GB = 0
+
+# ----------------------------------------------------------------------------------------------------------------------
+# runtime constants, AVOID modifications here...
+
+# number of parallel processing units, default of jobs
+# => lines of each processed block are shared among numba threads (prange), limited by NUMBA_NUM_THREADS
+NUMBER_OF_THREADS = max(4, cpu_count() // 2 if cpu_count() < 16 else cpu_count() // 4)
+
+# engine of temporal statistics
+# => numba: compiled kernel, lines of a block are shared among numba threads
+# => numpy: masked reductions over the time axis, chunks of NUMPY_CHUNK_LINES lines are processed in a thread pool
+STATISTICS_ENGINES = ('numba', 'numpy')
+STATISTICS_ENGINE = 'numba' if numba is not None else 'numpy'
+
+# numpy engine keeps about 6 temporary arrays of the size of processed chunk
+NUMPY_CHUNK_LINES = 64
+
+# Maximum number of blocks in flight: block being processed and blocks read ahead by I/O threads
+# => blocks are read ahead while the previous one is processed if at least 2 blocks fit the memory budget
+MAX_READ_BLOCKS = 3
+
+# number of I/O threads reading dates of a block in parallel
+IO_THREADS = 4
+
+# products are written by bands of TIFF_BLOCK_SIZE rows, reprojection warps from written file with this memory (MB)
+WARP_MEMORY_MB = 256
+
+# Out-of-core mode, default of jobs: full raster temporal statistics are kept in memory-mapped scratch files in output path
+# => resident memory depends on processing block size rather than on raster size
+OUT_OF_CORE = False
+
+# disable python garbage collector overhead
+DISABLE_GARBAGE_COLLECTOR = False
+
+# nodata / math constants
+INF_NEG_FLOAT32 = np.float32(-np.inf)
+INF_POS_FLOAT32 = np.float32(np.inf)
+SCENE_NODATA_FLOAT32 = np.float32(-999)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+# utility functions & classes
+# -- Memory / threads
+
+
+# numpy releases the GIL in reductions, so chunks run in parallel in threads of one pool created for the whole job and
+# they are passed by reference, nothing is pickled
+def starmap(pool, methods, params, chunksize=1):
+    return [pool.starmap(methods, params, chunksize)]
+
+
+# functions are compiled by numba when it is available, they are left in python otherwise
+def jit(**options):
+    return numba.jit(**options) if numba is not None else (lambda function: function)
+
+
+prange = numba.prange if numba is not None else range
+
+
+# compute total process memory usage, accounting for memory shared with all child processes
+
+
+def memory_usage(process):
+    try:
+        if system() == 'Windows':
+            mem = process.memory_full_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    mem += child.memory_full_info().uss
+                except:
+                    pass
+        else:
+            mem = process.memory_full_info().pss
+            for child in process.children(recursive=True):
+                try:
+                    mem += child.memory_full_info().uss
+                except:
+                    pass
+        return mem
+    except:
+        # maybe OS does not allow to query this information ?...
+        return 0
+
+# memory monitor thread
+
+
+class MemoryMonitor(Thread):    
+    def __init__(self, process, polling_delay):
+        self.event = Event()
+        self.polling_delay = polling_delay
+        self.process = process
+        self.memory = 0
+        Thread.__init__(self)
+        self.setDaemon(True)
+    
+    def stop(self):
+        self.event.set()
+    
+    def run(self):
+        while not self.event.is_set():
+            self.memory = max(self.memory, memory_usage(self.process))
+            time.sleep(self.polling_delay)
+    
+    def reset(self):
+        self.memory = 0
+    
+    def get_peak_memory(self):
+        return self.memory
+    
+    def get_peak_memory_gb(self):
+        return self.memory / 1024**3
+
+# -- Memory plan
+
+# estimated peak memory (bytes) of processing of raster of full_shape with depth dates by square blocks
+# => full raster statistics and rice map, unless they are kept out-of-core
+# => plus blocks in flight with temporaries of statistics engine, blocks with halo being classified or bands of
+#    products being written and warped, whichever is larger (blocks are released before building rice map)
+def memory_estimate(block_size, read_blocks, depth, full_shape, threads, engine, out_of_core, reproject=True):
+    full = 0 if out_of_core else full_shape[0] * full_shape[1] * (4 * 4 + 1)
+    block = block_size * block_size
+    # blocks in flight, statistics of block and windows of dates being read and decoded by I/O threads
+    statistics = read_blocks * block * depth * 4 + block * 4 * 4 + IO_THREADS * block * 4 * 2
+    if engine == 'numpy':
+        statistics += threads * min(block_size, NUMPY_CHUNK_LINES) * block_size * depth * 4 * 6
+    classification = threads * (block_size + 2 * RICE_MAPPING_HALO)**2 * 16
+    # band of float32 product or of class mask (bool and uint8)
+    write = min(write_rows(), full_shape[0]) * full_shape[1] * 4 + (WARP_MEMORY_MB * 1024**2 if reproject else 0)
+    return full + max(statistics, classification, write)
+
+# largest block size (multiple of MIN_BLOCK_SIZE up to block_size) and number of blocks in flight fitting budget
+# => reading ahead (2 blocks in flight at least) is preferred to larger blocks
+def memory_plan(budget, block_size, depth, full_shape, threads, engine, out_of_core, reproject=True):
+    largest = -(-max(full_shape) // MIN_BLOCK_SIZE) * MIN_BLOCK_SIZE
+    sizes = [min(block_size, largest)] + list(range(min(block_size, largest) // MIN_BLOCK_SIZE * MIN_BLOCK_SIZE, 0, -MIN_BLOCK_SIZE))
+    estimate = lambda size, blocks: memory_estimate(size, blocks, depth, full_shape, threads, engine, out_of_core, reproject)
+    for read_blocks in (2, 1):
+        for size in sizes:
+            if estimate(size, read_blocks) <= budget:
+                while read_blocks < MAX_READ_BLOCKS and estimate(size, read_blocks + 1) <= budget:
+                    read_blocks += 1
+                return size, read_blocks, estimate(size, read_blocks)
+    return sizes[-1], 1, estimate(sizes[-1], 1)
+
+# -- Block scheduler
+
+# windows of raster of full_shape processed by blocks of block_size x block_size pixels at most, in row-major order
+# => with source_blocksize (x, y) of internal tiles or strips of source rasters, windows are made of whole source
+#    blocks, so no compressed block is decoded twice, if a source block fits in a processing block
+# => strips (source blocks as wide as raster) give windows of full rows of the same area
+def block_windows(full_shape, block_size, source_blocksize=None):
+    full_height, full_width = full_shape
+    height, width = min(block_size, full_height), min(block_size, full_width)
+    if source_blocksize is not None:
+        source_width, source_height = source_blocksize
+        if source_width >= full_width and source_height < full_height:
+            height, width = min(full_height, max(1, block_size * block_size // full_width)), full_width
+        if source_width <= width and source_height <= height:
+            width = width if width == full_width else width // source_width * source_width
+            height = height if height == full_height else height // source_height * source_height
+    return [Window(x, y, min(width, full_width - x), min(height, full_height - y))
+            for y in range(0, full_height, height) for x in range(0, full_width, width)]
+
+# rows of bands of written products, whole tiles of output geotiff are written at once
+def write_rows():
+    return TIFF_BLOCK_SIZE if TIFF_BLOCK_SIZE >= 16 else MIN_BLOCK_SIZE
+
+# -- Read / compute pipeline
+
+# reads time series of blocks ahead of processing
+# => read(window, buffer) fills buffer by time series of window
+# => blocks are read into the given buffers only, a buffer is reused once the processing of its block is done, so the
+#    number of blocks in flight is bounded by the number of buffers
+# => stop() ends reading after the block being read, e.g. when processing failed, queues are polled with timeout so
+#    neither side waits forever for the other
+
+
+class BlockReader(Thread):
+    def __init__(self, read, windows, buffers, timeout=0.5):
+        self.read = read
+        self.windows = windows
+        self.timeout = timeout
+        self.free = Queue()
+        self.ready = Queue(len(buffers))
+        self.stopped = Event()
+        for buffer in buffers:
+            self.free.put(buffer)
+        Thread.__init__(self, daemon=True)
+
+    def run(self):
+        for window in self.windows:
+            buffer = self._get()
+            if buffer is None:
+                return
+            try:
+                self.read(window, buffer)
+            except Exception as e:
+                self._put((window, e))
+                return
+            if not self._put((window, buffer)):
+                return
+
+    # get free buffer, None once reader is stopped
+    def _get(self):
+        while not self.stopped.is_set():
+            try:
+                return self.free.get(timeout=self.timeout)
+            except Empty:
+                pass
+        return None
+
+    # put read block to queue, False once reader is stopped
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.ready.put(item, timeout=self.timeout)
+                return True
+            except Full:
+                pass
+        return False
+
+    # stop reading and wait for the block being read
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
+    # yield (window, buffer) of blocks in order, buffer is released when the next block is requested
+    def __iter__(self):
+        for _ in self.windows:
+            while True:
+                try:
+                    window, buffer = self.ready.get(timeout=self.timeout)
+                    break
+                except Empty:
+                    if not self.is_alive() and self.ready.empty():
+                        raise Exception('Block reader stopped before all blocks were read')
+            if isinstance(buffer, Exception):
+                raise buffer
+            yield window, buffer
+            self.free.put(buffer)
+
+# -- Out-of-core
+
+# zero filled array of memory-mapped scratch file, only pages being accessed are kept in memory
+def scratch_array(folder, name, shape, dtype):
+    return np.memmap(os.path.join(folder, name + '.dat'), dtype=dtype, mode='w+', shape=tuple(shape))
+
+# -- GeoTIFF
+
+
+def get_geotiff_infos(path):
+    tmp_map = gdal.Open(path, gdal.GA_ReadOnly)
+    metadata = tmp_map.GetMetadata()
+    gcps = tmp_map.GetGCPs()
+    projection = tmp_map.GetProjection()
+    transform = list(tmp_map.GetGeoTransform())
+    tmp_band = tmp_map.GetRasterBand(1)
+    nodata = tmp_band.GetNoDataValue()
+    compression = tmp_map.GetMetadata('IMAGE_STRUCTURE').get('COMPRESSION', None)
+    blocksize = tmp_band.GetBlockSize()
+    width, height = tmp_band.XSize, tmp_band.YSize
+    epsg = osr.SpatialReference(wkt=projection).GetAttrValue('AUTHORITY', 1)
+    tmp_band = None
+    tmp_map = None
+    return width, height, nodata, projection, transform, compression, blocksize, metadata, gcps, epsg
+
+# storage format of quantized scenes, its decoding table is built once and shared by all scenes
+@lru_cache(maxsize=8)
+def scene_storage(format, nodata):
+    return SceneStorage(format, nodata)
+
+# read window of opened scene as linear gamma0
+# => scenes stored as quantized dB (band tag GAMMA0=dB) are decoded by georice.storage, uint16 scenes keep code 0 for
+#    nodata, float16 scenes the nodata value of the band
+def read_gamma0(dataset, window):
+    data = dataset.read(1, window=window)
+    if dataset.tags(1).get('GAMMA0') != 'dB':
+        return data
+    if data.dtype == np.uint16:
+        return scene_storage('uint16', float(SCENE_NODATA_FLOAT32)).decode(data)
+    return scene_storage('float16', dataset.nodata).decode(data)
+
+# geotiff creation options of compression
+def creation_options(dtype, compressor=None, comp_level=None, extra_options=[]):
+    extra_opt = extra_options
+    if compressor is not None and type(compressor) is str and compressor.lower() != 'none':
+        cl = compressor.lower()
+        predictor = []
+        # choose proper predictor : 3 if floating point data, else 2
+        if cl in ['lzw', 'deflate', 'zstd'] and 'NBITS=1' not in extra_options:
+            dummy = dtype(0.5)
+            predictor = ['PREDICTOR=3'] if dummy == 0.5 else ['PREDICTOR=2']
+        level = []
+        if not comp_level is None:
+            if cl == 'deflate':
+                level = ['ZLEVEL=' + str(comp_level)]
+            elif cl == 'zstd':
+                level = ['ZSTD_LEVEL=' + str(comp_level)]
+            elif cl == 'jpeg':
+                level = ['JPEG_QUALITY=' + str(comp_level)]
+            elif cl == 'webp':
+                level = ['WEBP_LEVEL=' + str(comp_level)]
+        extra_opt = ['COMPRESS=' + compressor.upper()] + predictor + level + ['NUM_THREADS=' + str(min(4, cpu_count()))] + extra_opt
+    return extra_opt
+
+# save geotiff gdal helper
+
+
+def saveToGTiff(
+                npArray,
+                dstFilePath,
+                projection=None,
+                transform=None,
+                dstSRS=None,
+                dtype=None,
+                nodata=-np.inf,
+                metadata=None,
+                gcps=None,
+                compressor=None,  # deflate, lzw, zstd, jpeg, webp
+                comp_level=None,  # compression level
+                extra_options=[], # Extra geotiff options like TILED, BLOCKXSIZE, BLOCKYSIZE, NBITS, ... 
+                pos=[]            # Upper-left position of data (Warning: if set, disables dstSRS)
+                ):
+    # disable reprojection if data are saved in partial mode
+    if pos is None or len(pos) == 0:
+        pos = [0, 0]
+        dshape = npArray.shape
+    else:
+        dstSRS = None
+        dshape = pos[2]
+    
+    driver = gdal.GetDriverByName("GTiff")
+    if dtype is None:
+        dtype = npArray.dtype.type
+    nodata = np.float64(-np.inf if nodata is None else nodata)
+    gdal_dtype = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    extra_opt = creation_options(dtype, compressor, comp_level, extra_options)
+    
+    # Perform data reprojection if asked (only in full raster mode)
+    if not (dstSRS is None or projection is None or transform is None):
+        # https://stackoverflow.com/a/48706963
+        org = gdal_array.OpenArray(npArray)
+        org.SetProjection(projection)
+        org.SetGeoTransform(transform)
+        org.GetRasterBand(1).SetNoDataValue(nodata)
+        if gcps is not None and len(gcps) > 0:
+            org.SetGCPs(gcps)
+        dest = gdal.Warp('', org, dstSRS=dstSRS, format="VRT", outputType=gdal_dtype)
+        projection = dest.GetProjection()
+        transform = dest.GetGeoTransform()
+        npArray = dest.ReadAsArray()
+        dshape = npArray.shape
+        gcps = dest.GetGCPs()
+    
+    dst_ds = driver.Create(dstFilePath, dshape[1], dshape[0], 1, gdal_dtype, options=extra_opt)
+    if metadata is not None:
+        dst_ds.SetMetadata(metadata)
+    if gcps is not None and len(gcps) > 0:
+        dst_ds.SetGCPs(gcps)
+    dst_ds.GetRasterBand(1).SetNoDataValue(nodata)
+    if projection is not None:
+        dst_ds.SetProjection(projection)
+    if transform is not None:
+        dst_ds.SetGeoTransform(transform)
+    
+    dst_ds.GetRasterBand(1).WriteArray(npArray, pos[0], pos[1])
+    dst_ds.FlushCache()
+    dst_ds = None
+
+# save geotiff by bands of write_rows() rows, block(window) returns data of window, so the product is never held whole
+# in memory (array of full raster may be memory-mapped)
+# => reprojection warps the written file into dstFilePath, by chunks of WARP_MEMORY_MB
+def saveBlocksToGTiff(block, shape, dstFilePath, projection, transform, dstSRS=None, dtype=np.float32, nodata=-np.inf,
+                      compressor=None, comp_level=None, extra_options=[]):
+    nodata = np.float64(-np.inf if nodata is None else nodata)
+    gdal_dtype = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    options = creation_options(dtype, compressor, comp_level, extra_options)
+    reproject = not (dstSRS is None or projection is None or transform is None)
+    # not reprojected product is written uncompressed next to the output and warped from there
+    path = os.path.join(os.path.dirname(dstFilePath), '.warp_' + os.path.basename(dstFilePath)) if reproject else dstFilePath
+    
+    driver = gdal.GetDriverByName("GTiff")
+    dst_ds = driver.Create(path, shape[1], shape[0], 1, gdal_dtype, options=extra_options if reproject else options)
+    dst_ds.GetRasterBand(1).SetNoDataValue(nodata)
+    if projection is not None:
+        dst_ds.SetProjection(projection)
+    if transform is not None:
+        dst_ds.SetGeoTransform(transform)
+    rows = write_rows()
+    for y in range(0, shape[0], rows):
+        window = Window(0, y, shape[1], min(rows, shape[0] - y))
+        dst_ds.GetRasterBand(1).WriteArray(np.asarray(block(window), dtype=dtype), 0, y)
+    dst_ds.FlushCache()
+    dst_ds = None
+    
+    if reproject:
+        try:
+            dst_ds = gdal.Warp(dstFilePath, path, format='GTiff', dstSRS=dstSRS, outputType=gdal_dtype,
+                               srcNodata=nodata, dstNodata=nodata, creationOptions=options,
+                               warpMemoryLimit=WARP_MEMORY_MB, multithread=True)
+            dst_ds = None
+        finally:
+            os.remove(path)
+
+# partial update of geotiff
+def updateGTiff(npArray, dstFilePath, pos=[]):
+    dst_ds = gdal.Open(dstFilePath, gdal.GA_Update)
+    if pos is None or len(pos) == 0:
+        pos = [0, 0]
+    dst_ds.GetRasterBand(1).WriteArray(npArray, pos[0], pos[1])
+    dst_ds.FlushCache()
+    dst_ds = None
+
+#--- dates
+
+# gregorian date to julian helper (https://gist.github.com/jiffyclub/1294443)
+def date_to_jd(year,month,day):
+    if month == 1 or month == 2:
+        yearp = year - 1
+        monthp = month + 12
+    else:
+        yearp = year
+        monthp = month
+    
+    # this checks where we are in relation to October 15, 1582, the beginning
+    # of the Gregorian calendar.
+    if ((year < 1582) or
+        (year == 1582 and month < 10) or
+        (year == 1582 and month == 10 and day < 15)):
+        # before start of Gregorian calendar
+        B = 0
+    else:
+        # after start of Gregorian calendar
+        A = math.trunc(yearp / 100.)
+        B = 2 - A + math.trunc(A / 4.)
+    
+    if yearp < 0:
+        C = math.trunc((365.25 * yearp) - 0.75)
+    else:
+        C = math.trunc(365.25 * yearp)
+    
+    D = math.trunc(30.6001 * (monthp + 1))
+    jd = B + C + D + day + 1720994.5
+    return jd
+
+YEAR_0 = date_to_jd(0, 1, 1)
+
+# helper function to emulate matlab julian day from first day of year 0
+def date_to_jd_from_year_0(datetime64_or_year, month=None, day=None):
+    global YEAR_0
+    if type(datetime64_or_year) is dt.date:
+        return date_to_jd(datetime64_or_year.year, datetime64_or_year.month, datetime64_or_year.day) - YEAR_0
+    elif type(datetime64_or_year) is np.datetime64:
+        dd = dt.datetime.utcfromtimestamp(datetime64_or_year.astype(object)/1e9)
+        return date_to_jd(dd.year, dd.month, dd.day) - YEAR_0
+    else:
+        return date_to_jd(datetime64_or_year, month, day) - YEAR_0
+
+# ----------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+# processing functions
+
+# same as remove_small_objects followed by remove_small_holes of scikit-image, in place, by labeling of scipy which
+# does not depend on version of scikit-image
+def remove_small(mask, objects_threshold, objects_connectivity, holes_threshold, holes_connectivity):
+    for value, threshold, connectivity in [(True, objects_threshold, objects_connectivity),
+                                           (False, holes_threshold, holes_connectivity)]:
+        labels, _ = ndimage.label(mask == value, ndimage.generate_binary_structure(mask.ndim, connectivity))
+        small = np.bincount(labels.ravel()) < threshold
+        small[0] = False
+        mask[small[labels]] = not value
+
+def rice_mapping(temporal_mean, temporal_max_increase, temporal_min, temporal_max, rice_threshold_dB,
+                 urban_trees_threshold_dB=urban_trees_threshold_dB, water_threshold_dB=water_threshold_dB):
+    # Define the classes
+    class_type={"no_data":0, "rice":1, "urban_tree":2, "water":3, "other":4}
+    
+    holes_threshold = HOLES_THRESHOLD
+    holes_connectivity = 2
+    objects_threshold = OBJECTS_THRESHOLD
+    objects_connectivity = 2
+    
+    ricemap = np.full(temporal_mean.shape, class_type["no_data"], dtype=np.uint8)
+    
+    # Apply threshold to the 0 value => no data
+    ma = temporal_mean > 0
+    remove_small(ma, objects_threshold, objects_connectivity, holes_threshold, holes_connectivity)
+    ricemap[ma] = class_type["other"]
+    
+    # Apply threshold to the temporal maximum increase => Rice
+    ma = temporal_max_increase > 10**(rice_threshold_dB/10.)
+    remove_small(ma, objects_threshold, objects_connectivity, holes_threshold, holes_connectivity)
+    ricemap[ma] = class_type["rice"]
+    
+    # Apply threshold to the temporal minimum value => Urban or forest
+    ma = temporal_min > 10**(urban_trees_threshold_dB/10.)
+    remove_small(ma, objects_threshold, objects_connectivity, holes_threshold, holes_connectivity)
+    ricemap[ma] = class_type["urban_tree"]
+    
+    # Apply threshold to the temporal max value => Water
+    ma = temporal_max < 10**(water_threshold_dB/10.)
+    remove_small(ma, objects_threshold, objects_connectivity, holes_threshold, holes_connectivity)
+    ricemap[ma] = class_type["water"]
+    
+    return ricemap
+
+# same result as rice_mapping by numba kernels: class masks are thresholded in one pass, small objects and holes of
+# a mask are found by one labeling of objects and background shared by both steps, classes are painted in one pass
+def rice_mapping_fused(temporal_mean, temporal_max_increase, temporal_min, temporal_max, rice_threshold_dB,
+                       urban_trees_threshold_dB=urban_trees_threshold_dB, water_threshold_dB=water_threshold_dB):
+    # thresholds are compared in float32 as numpy does for float32 statistics
+    masks = class_masks(temporal_mean, temporal_max_increase, temporal_min, temporal_max,
+                        np.float32(10**(rice_threshold_dB/10.)), np.float32(10**(urban_trees_threshold_dB/10.)),
+                        np.float32(10**(water_threshold_dB/10.)))
+    for mask in masks:
+        clean_mask(mask, OBJECTS_THRESHOLD, HOLES_THRESHOLD)
+    return paint_classes(masks)
+
+# rice map of window written into out, classified on the window extended by RICE_MAPPING_HALO
+# => same result as rice_mapping of full raster, blocks can be processed in parallel
+def rice_mapping_block(window, temporal_mean, temporal_max_increase, temporal_min, temporal_max, rice_threshold_dB, out,
+                       urban_trees_threshold_dB=urban_trees_threshold_dB, water_threshold_dB=water_threshold_dB):
+    full_height, full_width = temporal_mean.shape
+    y0, x0 = window.row_off, window.col_off
+    y1, x1 = min(full_height, y0 + window.height), min(full_width, x0 + window.width)
+    if y1 <= y0 or x1 <= x0:
+        return
+    hy0, hx0 = max(0, y0 - RICE_MAPPING_HALO), max(0, x0 - RICE_MAPPING_HALO)
+    hy1, hx1 = min(full_height, y1 + RICE_MAPPING_HALO), min(full_width, x1 + RICE_MAPPING_HALO)
+    halo = (slice(hy0, hy1), slice(hx0, hx1))
+    classify = rice_mapping_fused if numba is not None else rice_mapping
+    ricemap = classify(np.asarray(temporal_mean[halo]), np.asarray(temporal_max_increase[halo]), np.asarray(temporal_min[halo]), np.asarray(temporal_max[halo]), rice_threshold_dB, urban_trees_threshold_dB, water_threshold_dB)
+    out[y0:y1, x0:x1] = ricemap[y0-hy0:y1-hy0, x0-hx0:x1-hx0]
+
+# ----------------------------------------------------------------------------------------------------------------------
+# numba processing functions
+
+@jit(nopython=True, nogil=True, fastmath=False)
+def min_argmin(a):
+    vmin, imin = a[0], 0
+    for i, v in enumerate(a):
+        if v < vmin and not (np.isinf(v) or np.isnan(v)):
+            vmin, imin = v, i
+    return vmin, imin
+
+@jit(nopython=True, nogil=True, fastmath=False)
+def min_(a):
+    vmin = a[0]
+    for i, v in enumerate(a):
+        if v < vmin and not (np.isinf(v) or np.isnan(v)):
+            vmin = v
+    return vmin
+
+@jit(nopython=True, nogil=True, fastmath=False)
+def max_(a):
+    vmax = a[0]
+    for i, v in enumerate(a):
+        if v > vmax and not (np.isinf(v) or np.isnan(v)):
+            vmax = v
+    return vmax
+
+@jit(nopython=True, nogil=True, fastmath=False)
+def mean_(a):
+    s, cnt = 0, 0
+    for i, v in enumerate(a):
+        if not np.isinf(v) and not np.isnan(v):
+            s += v
+            cnt += 1
+    return s / cnt if cnt > 0 else np.nan
+
+# statistics of time series of one pixel, same results as min_/max_/mean_/min_argmin applied on acquisitions >= -29dB
+# => passes over the time axis without temporary arrays
+@jit(nopython=True, nogil=True, fastmath=False)
+def pixel_statistics(pixel_vh, time_0):
+    mean_vh, incr_vh, min_vh, max_vh = 0, 0, INF_NEG_FLOAT32, INF_POS_FLOAT32
+    depth = pixel_vh.shape[0]
+    # count, mean, min and max of pixels >= -29dB, the first one initializes min and max even if it is infinite
+    count, finite, s = 0, 0, 0.
+    for t in range(depth):
+        v = pixel_vh[t]
+        if v > 0.0013:
+            if count == 0:
+                min_vh, max_vh = v, v
+            elif not np.isinf(v):
+                if v < min_vh:
+                    min_vh = v
+                if v > max_vh:
+                    max_vh = v
+            if not np.isinf(v):
+                s += v
+                finite += 1
+            count += 1
+    if count > 0:
+        mean_vh = s / finite if finite > 0 else np.nan
+    if count > 1:
+        # temporal min within the first half of pixels >= -29dB
+        temporal_min, time_min, seen = INF_POS_FLOAT32, 0, 0
+        for t in range(depth):
+            v = pixel_vh[t]
+            if v > 0.0013:
+                if seen == 0 or (v < temporal_min and not np.isinf(v)):
+                    temporal_min, time_min = v, time_0[t]
+                seen += 1
+                if seen == count // 2:
+                    break
+        # the max is located at least 20 days after the min
+        vmax, selected = INF_POS_FLOAT32, 0
+        for t in range(depth):
+            v = pixel_vh[t]
+            if v > 0.0013 and time_0[t] >= time_min + 20:
+                if selected == 0 or (v > vmax and not np.isinf(v)):
+                    vmax = v
+                selected += 1
+        if selected > 0:
+            incr_vh = vmax / temporal_min
+    return mean_vh, incr_vh, min_vh, max_vh
+
+@jit(nopython=True, nogil=True, fastmath=False)
+def global_statistics(vh, time_0):
+    h, w = vh.shape[0:2]
+    out_mean = np.zeros((h, w), dtype=np.float32)
+    out_incr = np.zeros((h, w), dtype=np.float32)
+    out_min = np.zeros((h, w), dtype=np.float32)
+    out_max = np.zeros((h, w), dtype=np.float32)
+    for y in range(h):
+        for x in range(w):
+            out_mean[y, x], out_incr[y, x], out_min[y, x], out_max[y, x] = pixel_statistics(vh[y, x, :], time_0)
+    return out_mean, out_incr, out_min, out_max
+
+# lines are processed in parallel by numba threads
+@jit(nopython=True, nogil=True, parallel=True, fastmath=False)
+def global_statistics_parallel(vh, time_0):
+    h, w = vh.shape[0:2]
+    out_mean = np.zeros((h, w), dtype=np.float32)
+    out_incr = np.zeros((h, w), dtype=np.float32)
+    out_min = np.zeros((h, w), dtype=np.float32)
+    out_max = np.zeros((h, w), dtype=np.float32)
+    for y in prange(h):
+        for x in range(w):
+            out_mean[y, x], out_incr[y, x], out_min[y, x], out_max[y, x] = pixel_statistics(vh[y, x, :], time_0)
+    return out_mean, out_incr, out_min, out_max
+
+# masks of classes other, rice, urban/trees and water of rice_mapping before removal of small objects and holes
+@jit(nopython=True, nogil=True, fastmath=False)
+def class_masks(temporal_mean, temporal_max_increase, temporal_min, temporal_max, rice_threshold, urban_trees_threshold, water_threshold):
+    h, w = temporal_mean.shape
+    masks = np.empty((4, h, w), dtype=np.bool_)
+    for y in range(h):
+        for x in range(w):
+            masks[0, y, x] = temporal_mean[y, x] > 0
+            masks[1, y, x] = temporal_max_increase[y, x] > rice_threshold
+            masks[2, y, x] = temporal_min[y, x] > urban_trees_threshold
+            masks[3, y, x] = temporal_max[y, x] < water_threshold
+    return masks
+
+# union-find of labels of components, the root of a component is its smallest label
+@jit(nopython=True, nogil=True)
+def find_root(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        next_i = parent[i]
+        parent[i] = root
+        i = next_i
+    return root
+
+@jit(nopython=True, nogil=True)
+def union(parent, size, a, b):
+    a, b = find_root(parent, a), find_root(parent, b)
+    if a != b:
+        if b < a:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+
+# array of twice the size starting by given one
+@jit(nopython=True, nogil=True)
+def grow(a):
+    grown = np.empty(2 * a.shape[0], dtype=a.dtype)
+    grown[:a.shape[0]] = a
+    return grown
+
+# same as remove_small_objects followed by remove_small_holes with connectivity 2 (8-neighbourhood), in place
+# => objects and background are labeled by one scan, removed objects are merged with the background they touch
+@jit(nopython=True, nogil=True)
+def clean_mask(mask, objects_threshold, holes_threshold):
+    h, w = mask.shape
+    labels = np.empty((h, w), dtype=np.int32)
+    parent = np.empty(max(16, h * w // 16), dtype=np.int32)
+    size = np.empty(parent.shape[0], dtype=np.int32)
+    background = np.empty(parent.shape[0], dtype=np.bool_)
+    n = 0
+    for y in range(h):
+        for x in range(w):
+            v = mask[y, x]
+            # pixels of previous row adjacent to the pixel above are already in its component
+            if y > 0 and mask[y-1, x] == v:
+                label = labels[y-1, x]
+            else:
+                label, other = -1, -1
+                if x > 0 and mask[y, x-1] == v:
+                    label = labels[y, x-1]
+                elif y > 0 and x > 0 and mask[y-1, x-1] == v:
+                    label = labels[y-1, x-1]
+                if y > 0 and x < w - 1 and mask[y-1, x+1] == v:
+                    other = labels[y-1, x+1]
+                if label < 0:
+                    label = other
+                elif other >= 0:
+                    a, b = find_root(parent, label), find_root(parent, other)
+                    parent[max(a, b)] = min(a, b)
+                if label < 0:
+                    if n == parent.shape[0]:
+                        parent, size, background = grow(parent), grow(size), grow(background)
+                    parent[n], size[n], background[n] = n, 0, not v
+                    label = n
+                    n += 1
+            labels[y, x] = label
+            size[label] += 1
+    # sizes of components at their roots, roots precede other labels of their components
+    for i in range(n):
+        parent[i] = parent[parent[i]]
+        if parent[i] != i:
+            size[parent[i]] += size[i]
+    # objects smaller than threshold are removed and merged with touching background
+    removed = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        removed[i] = not background[i] and size[parent[i]] < objects_threshold
+        background[i] = background[i] or removed[i]
+    for y in range(h):
+        for x in range(w):
+            label = labels[y, x]
+            if mask[y, x] and removed[label]:
+                mask[y, x] = False
+                for ny in range(max(0, y - 1), min(h, y + 2)):
+                    for nx in range(max(0, x - 1), min(w, x + 2)):
+                        if labels[ny, nx] != label and background[labels[ny, nx]]:
+                            union(parent, size, label, labels[ny, nx])
+    # holes smaller than threshold are filled
+    for i in range(n):
+        removed[i] = background[i] and size[find_root(parent, i)] < holes_threshold
+    for y in range(h):
+        for x in range(w):
+            if not mask[y, x] and removed[labels[y, x]]:
+                mask[y, x] = True
+
+# classes of rice map painted in priority order of rice_mapping
+@jit(nopython=True, nogil=True)
+def paint_classes(masks):
+    h, w = masks.shape[1:]
+    ricemap = np.zeros((h, w), dtype=np.uint8)
+    for y in range(h):
+        for x in range(w):
+            if masks[3, y, x]:
+                ricemap[y, x] = 3
+            elif masks[2, y, x]:
+                ricemap[y, x] = 2
+            elif masks[1, y, x]:
+                ricemap[y, x] = 1
+            elif masks[0, y, x]:
+                ricemap[y, x] = 4
+    return ricemap
+
+# numpy processing functions
+
+# same results as global_statistics by masked reductions over the time axis, time_0 has to be sorted
+def global_statistics_numpy(vh, time_0):
+    h, w, depth = vh.shape
+    take = lambda a, index: np.take_along_axis(a, index[:, :, None], axis=2)[:, :, 0]
+    # consider only pixels >= -29dB, min/max/mean skip infinite ones
+    valid = vh > 0.0013
+    finite = valid & ~np.isinf(vh)
+    rank = np.cumsum(valid, axis=2, dtype=np.int32)
+    count = rank[:, :, -1]
+    first_index = valid.argmax(axis=2)
+    first = take(vh, first_index)
+    # sequential sum in float64 as numba kernel
+    s = np.zeros((h, w), dtype=np.float64)
+    for t in range(depth):
+        s += np.where(finite[:, :, t], vh[:, :, t], 0)
+    finite_count = finite.sum(axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out_mean = np.where(count > 0, np.where(finite_count > 0, s / finite_count, np.nan), 0).astype(np.float32)
+    # suffix max of finite pixels, i.e. max over pixels from the time t on
+    suffix_max = np.maximum.accumulate(np.where(finite, vh, INF_NEG_FLOAT32)[:, :, ::-1], axis=2)[:, :, ::-1]
+    # the first pixel initializes min and max even if it is infinite
+    out_min = np.where(count > 0, np.minimum(first, np.where(finite, vh, INF_POS_FLOAT32).min(axis=2)), INF_NEG_FLOAT32)
+    out_max = np.where(count > 0, np.where(np.isinf(first), first, suffix_max[:, :, 0]), INF_POS_FLOAT32)
+    # temporal min within the first half of pixels, first occurrence
+    half = finite & (rank <= count[:, :, None] // 2)
+    min_index = np.where(half.any(axis=2), np.where(half, vh, INF_POS_FLOAT32).argmin(axis=2), first_index)
+    temporal_min = take(vh, min_index)
+    # the max is located at least 20 days after the min => pixels from index start to the end of time series
+    start = np.searchsorted(time_0, time_0[min_index] + 20)
+    rank_before = np.where(start > 0, take(rank, np.maximum(start - 1, 0)), 0)
+    vmax = take(suffix_max, np.minimum(start, depth - 1))
+    # the first selected pixel initializes the max even if it is infinite
+    first_selected = valid & (rank == rank_before[:, :, None] + 1)
+    vmax = np.where((first_selected & np.isinf(vh)).any(axis=2), INF_POS_FLOAT32, vmax)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        out_incr = np.where((count > 1) & (count > rank_before), vmax / temporal_min, 0).astype(np.float32)
+    return out_mean, out_incr, out_min, out_max
+
+# ----------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+# jobs
+
+# selection of scene files of orbit, direction and period, duplicated dates are resolved by txxx_mode
+# => array of (file name, date) sorted by date
+def select_scenes(names, data_path, desiredorbit, desireddirection, date_start, date_end, txxx_mode):
+    list_of_raster_vh = []
+    list_of_datetime_vh = []
+    orbit, orbitdir, polar, date = None, None, None, None
+    
+    for file in names:
+        # accept only sentinel-1 filtered images
+        accept_file = file.startswith('S1') and file.endswith('.tif')
+        if accept_file:
+            file_split = file.split('_')
+            orbit = file_split[4]
+            orbitdir = file_split[3]
+            polar = file_split[2]
+            polar = polar.lower()
+            date = file_split[5][:8]
+            date = dt.datetime.strptime(date, '%Y%m%d').date()
+            if (orbit == desiredorbit) and (orbitdir == desireddirection) and (polar == 'vh') and (date_start <= date <= date_end):
+                # handle duplicated dates
+                if date in list_of_datetime_vh:
+                    id = list_of_datetime_vh.index(date)
+                    current = list_of_raster_vh[id]
+                    if txxx_mode in ['txxx','nontxxx']:
+                        print("  [vh] duplicate @ " + str(date) + " => keeping last modified: (" + file + " / " + current + ")")
+                        if os.path.getmtime(os.path.join(data_path, file)) > os.path.getmtime(os.path.join(data_path, current)):
+                            list_of_raster_vh[id] = file
+                    else:
+                        print("  [vh] duplicate @ " + str(date) + " => keeping (1)txxxxxx (2)last modified: (" + file + " / " + current + ")")
+                        if ('txxxxxx' in file and 'txxxxxx' in current) or (not 'txxxxxx' in file and not 'txxxxxx' in current):
+                            if os.path.getmtime(os.path.join(data_path, file)) > os.path.getmtime(os.path.join(data_path, current)):
+                                list_of_raster_vh[id] = file
+                        elif 'txxxxxx' in file:
+                            list_of_raster_vh[id] = file
+                else:
+                    list_of_raster_vh.append(file)
+                    list_of_datetime_vh.append(date)
+    
+    # Sorting data in a chronological order
+    a = np.empty((len(list_of_raster_vh),2), dtype=object)
+    for i in range(len(list_of_raster_vh)):
+        a[i,0] = list_of_raster_vh[i]
+        a[i,1] = list_of_datetime_vh[i]
+    return a[np.argsort(a[:,1]),:]
+
+
+class RicemapJob:
+    """
+    Rice map of scenes of one orbit and direction for a period. Processing options default to constants of this
+    module.
+    """
+
+    def __init__(self, data_path, orbit, starting_date, ending_date, output_path, direction='DES', intermediate=False,
+                 lzw=False, masks=False, reproject=True, threads=NUMBER_OF_THREADS,
+                 thresholds=(RICE_THRESHOLD_DB, urban_trees_threshold_dB, water_threshold_dB), txxx_mode='all',
+                 cube_path=None, engine=None, max_memory_gb=MAX_MEMORY_GB, out_of_core=OUT_OF_CORE,
+                 block_size=BLOCK_SIZE):
+        """
+        :param data_path: str, folder of scene files
+        :param orbit: str, relative orbit number, three digits i.e. '018'
+        :param starting_date: str, YYYYMMDD, inclusive
+        :param ending_date: str, YYYYMMDD, inclusive
+        :param output_path: str, products are written into its folder ricemaps
+        :param direction: str, orbit direction ASC or DES
+        :param intermediate: bool, write temporal statistics (mean/max_increase/min/max)
+        :param lzw: bool, write products using LZW compression instead of DEFLATE
+        :param masks: bool, write rice, trees, water, other and nodata masks
+        :param reproject: bool, reproject products to EPSG:4326
+        :param threads: int, number of parallel processing units
+        :param thresholds: tuple(float, float, float), rice/trees/water thresholds in dB
+        :param txxx_mode: str, input raster selection mode: 'txxx', 'nontxxx' or 'all'
+        :param cube_path: str, read time series from temporal cube of scenes instead of data_path, default None
+        :param engine: str, engine of temporal statistics: 'numba' or 'numpy', default numba if it is installed
+        :param max_memory_gb: float, memory budget in GB, 0 - 80% of available memory
+        :param out_of_core: bool, keep temporal statistics in memory-mapped scratch files of output folder
+        :param block_size: int, maximum size of square processing blocks in pixels
+        """
+        engine = engine or STATISTICS_ENGINE
+        if engine not in STATISTICS_ENGINES:
+            raise Exception(f'Unknown engine {engine}, use one of: {", ".join(STATISTICS_ENGINES)}')
+        if engine == 'numba' and numba is None:
+            raise Exception('Engine numba is not available, install numba or use engine numpy')
+        self.data_path = data_path
+        self.orbit = orbit
+        self.starting_date = starting_date
+        self.ending_date = ending_date
+        self.output_path = output_path
+        self.direction = direction.upper()
+        self.intermediate = intermediate
+        self.lzw = lzw
+        self.masks = masks
+        self.reproject = reproject
+        self.threads = threads if threads > 0 else 2
+        self.thresholds = tuple(float(v) for v in thresholds)
+        self.txxx_mode = txxx_mode
+        self.cube_path = cube_path
+        self.engine = engine
+        self.max_memory_gb = max_memory_gb
+        self.out_of_core = out_of_core
+        self.block_size = block_size
+
+
+class RicemapResult:
+    """Products and metrics of processed RicemapJob"""
+
+    def __init__(self, paths, metrics):
+        """
+        :param paths: dict, product name (ricemap, temporalMean, ..., mask_rice, ...) => path of written file
+        :param metrics: dict, dates, shape, blocks, block_shape, read_blocks, engine, threads, seconds,
+        memory_estimated_gb and memory_peak_gb of processing
+        """
+        self.paths = paths
+        self.metrics = metrics
+
+
+def run(job):
+    """
+    Process job in current process. Compiled kernels and decoding tables of scenes are kept for next jobs of the
+    process.
+    :param job: RicemapJob
+    :return: RicemapResult
+    """
+    process = psutil.Process(os.getpid())
+    cube = SceneCube(job.cube_path) if job.cube_path is not None else None
+    rice_threshold, trees_threshold, water_threshold = job.thresholds
+    
+    date_start = dt.datetime.strptime(job.starting_date, '%Y%m%d').date()
+    date_end = dt.datetime.strptime(job.ending_date, '%Y%m%d').date()
+    
+    print()
+    print("- Orbit: " + job.orbit)
+    print("- Direction: " + job.direction)
+    print("- From " + date_start.strftime("%d, %b %Y") + " to " + date_end.strftime("%d, %b %Y"))
+    
+    try:
+        names = cube.names if cube is not None else next(os.walk(job.data_path))[2]
+    except StopIteration:
+        raise Exception(f'Folder {job.data_path} seems empty...')
+    list_of_raster_vh = select_scenes(names, job.data_path, job.orbit, job.direction, date_start, date_end, job.txxx_mode)
+    if len(list_of_raster_vh) == 0:
+        raise Exception('Unable to find data fitting the selected time period / orbit / direction / ...')
+    
+    # gather some informations about products to prefix output data files
+    product = list_of_raster_vh[0, 0].split('_')
+    output_suffix_short = '_' + product[1] + '_' + product[3] + '_' + product[4]
+    output_suffix = output_suffix_short + '_' + job.starting_date + '_' + job.ending_date + '.tif'
+    
+    # ------------------------------------------------------------------------------------------------------------------
+    # initialize processing
+    
+    output_path = os.path.join(job.output_path, 'ricemaps')
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+    compressor = 'lzw' if job.lzw else 'deflate'
+    dstSRS = 'EPSG:4326' if job.reproject else None
+    
+    # gathering informations from 1st date geotiff (to be replicated in output geotiff)
+    if cube is not None:
+        (full_height, full_width), nodata = cube.shape, cube.storage.nodata
+        projection, transform = rio.crs.CRS.from_user_input(cube.crs).to_wkt(), list(cube.transform.to_gdal())
+        cube_frames = [cube.names.index(f) for f in list_of_raster_vh[:, 0]]
+        blocksize = (cube.chunk_size, cube.chunk_size)
+    else:
+        full_width, full_height, nodata, projection, transform, compression, blocksize, _, _, epsg = get_geotiff_infos(os.path.join(job.data_path, list_of_raster_vh[0,0]))
+        blocksize = tuple(blocksize)
+    depth = len(list_of_raster_vh)
+    
+    # choose processing block size and blocks in flight from memory budget and set data shape
+    full_shape = [full_height, full_width]
+    memory_budget = job.max_memory_gb * 1024**3 if job.max_memory_gb > 0 else psutil.virtual_memory().available * 0.8
+    block_size, read_blocks, memory_estimated = memory_plan(memory_budget, job.block_size, depth, full_shape, job.threads, job.engine, job.out_of_core, job.reproject)
+    
+    # work lists of blocks: reading and statistics follow blocks of source rasters, rice map is classified by square
+    # blocks as its halo is read from temporal statistics in memory
+    windows = block_windows(full_shape, block_size, blocksize)
+    ricemap_windows = block_windows(full_shape, block_size)
+    
+    # handle output tiff options
+    if TIFF_BLOCK_SIZE >= 16:
+        geotiff_options = ['TILED=YES', 'BLOCKXSIZE='+str(TIFF_BLOCK_SIZE),'BLOCKYSIZE='+str(TIFF_BLOCK_SIZE)]
+    else:
+        geotiff_options = ['TILED=NO']
+    
+    # create time scale in Jd relative to day 1 of year 0
+    time_0 = np.array([int(date_to_jd_from_year_0(list_of_raster_vh[t,1])) for t in range(len(list_of_raster_vh))])
+    
+    print("- Time scale (julian days, since day 1 of year 0): %d dates, %d -> %d"%(len(time_0), time_0[0], time_0[-1]))
+    print("- Threads:", job.threads)
+    print("- Engine:", job.engine)
+    print("- Memory budget: %.2fG => blocks of %dx%d px, %d blocks in flight, estimated peak %.2fG"%(memory_budget / 1024**3, windows[0].height, windows[0].width, read_blocks, memory_estimated / 1024**3))
+    print("- Blocks: %d, source blocks of %dx%d px"%(len(windows), blocksize[1], blocksize[0]))
+    if memory_estimated > memory_budget:
+        print("  WARNING: memory budget is exceeded by the smallest blocks%s"%('' if job.out_of_core else ', out-of-core mode (-oc) keeps full raster products on disk'))
+    
+    # numba threads of parallel kernel or processing units pool of numpy engine
+    thread_pool, io_pool, reader, datasets, scratch_path = None, None, None, [], None
+    if job.engine == 'numba':
+        numba.set_num_threads(min(job.threads, numba.config.NUMBA_NUM_THREADS))
+    else:
+        thread_pool = ThreadPool(job.threads)
+    
+    # memory monitor thread
+    monitor = MemoryMonitor(process, 1)
+    monitor.start()
+    
+    if DISABLE_GARBAGE_COLLECTOR:
+        gc.disable()
+    
+    # pools, scenes and scratch files are released when the job fails as well
+    try:
+        # allocate dataset, blocks in flight are limited by memory budget
+        cube_shape = [windows[0].height, windows[0].width, depth]
+        read_blocks = min(read_blocks, len(windows))
+        buffers = [np.zeros(cube_shape, dtype=np.float32) for _ in range(read_blocks)]
+        if job.out_of_core:
+            scratch_path = tempfile.mkdtemp(prefix='.scratch_', dir=output_path)
+            allocate = lambda name, dtype=np.float32: scratch_array(scratch_path, name, full_shape, dtype)
+            print("- Out-of-core:", scratch_path)
+        else:
+            allocate = lambda name, dtype=np.float32: np.zeros(full_shape, dtype=dtype)
+        temporal_mean = allocate('temporal_mean')
+        temporal_max_increase = allocate('temporal_max_increase')
+        temporal_min = allocate('temporal_min')
+        temporal_max = allocate('temporal_max')
+        
+        start_time = time.time()
+        
+        # scenes are kept opened for the whole job, dates of a block are read in parallel by I/O threads
+        if cube is None:
+            datasets = [rio.open(os.path.join(job.data_path, f)) for f in list_of_raster_vh[:, 0]]
+            io_pool = ThreadPool(IO_THREADS)
+        
+        def read_date(window, buffer, i):
+            buffer[:window.height, :window.width, i] = read_gamma0(datasets[i], window)
+        
+        # time series of a block are read from the cube at once
+        def read_block(window, buffer):
+            if cube is not None:
+                cube.read(window, cube_frames, buffer[:window.height, :window.width, :depth])
+            else:
+                io_pool.starmap(read_date, [(window, buffer, i) for i in range(depth)])
+        
+        print()
+        print("Gathering data statistics for whole time scale", end=' ', flush=True)
+        
+        reader = BlockReader(read_block, windows, buffers)
+        reader.start()
+        
+        for block, (window, S1_dataset_vh) in enumerate(reader):
+            
+            print('%d/%d'%(block+1, len(windows)), end=' ', flush=True)
+            x_pos, y_pos, width, height = window.col_off, window.row_off, window.width, window.height
+            
+            # gather statistics (temporal min, max, mean, max_increase) over the whole time scale
+            if job.engine == 'numba':
+                lines = [0, height]
+                results = [global_statistics_parallel(S1_dataset_vh[:height, :width, :len(time_0)], time_0)]
+            else:
+                lines = list(range(0, height, NUMPY_CHUNK_LINES)) + [height]
+                params = [[S1_dataset_vh[lines[i]:lines[i+1], :width, :len(time_0)], time_0] for i in range(len(lines)-1)]
+                results = starmap(thread_pool, global_statistics_numpy, params)[0]
+            for i, r in enumerate(results):
+                c0, cn = x_pos, x_pos + width
+                l0, ln = y_pos+lines[i], y_pos+lines[i+1]
+                temporal_mean[l0:ln, c0:cn] = r[0]
+                temporal_max_increase[l0:ln, c0:cn] = r[1]
+                temporal_min[l0:ln, c0:cn] = r[2]
+                temporal_max[l0:ln, c0:cn] = r[3]
+            # written pages of scratch files can be reclaimed once they are flushed
+            if job.out_of_core:
+                for statistic in (temporal_mean, temporal_max_increase, temporal_min, temporal_max):
+                    statistic.flush()
+        
+        # release blocks before building rice map
+        reader.stop()
+        reader = None
+        del buffers, S1_dataset_vh, results
+        
+        print()
+        print("Building rice map")
+        
+        # blocks are classified in parallel, in memory of processed blocks only
+        S1_dataset_ricemap = allocate('ricemap', np.uint8)
+        params = [[w, temporal_mean, temporal_max_increase, temporal_min, temporal_max, rice_threshold, S1_dataset_ricemap, trees_threshold, water_threshold] for w in ricemap_windows]
+        with ThreadPool(job.threads) as pool:
+            starmap(pool, rice_mapping_block, params)
+        
+        print("Writing output product(s)")
+        
+        # products and masks are written by bands of rows, read from memory-mapped arrays in out-of-core mode
+        paths = {'ricemap': os.path.join(output_path, 'ricemap'+output_suffix)}
+        band = lambda array: (lambda w: array[w.row_off:w.row_off+w.height, :])
+        saveBlocksToGTiff(band(S1_dataset_ricemap), full_shape, paths['ricemap'], projection, transform, dstSRS, np.uint8, 0, compressor, None, geotiff_options)
+        if job.intermediate:
+            for name, statistic in [('temporalMean', temporal_mean), ('temporalMaxIncrease', temporal_max_increase),
+                                    ('temporalMin', temporal_min), ('temporalMax', temporal_max)]:
+                paths[name] = os.path.join(output_path, name+output_suffix)
+                saveBlocksToGTiff(band(statistic), full_shape, paths[name], projection, transform, dstSRS, np.float32, None, compressor, None, geotiff_options)
+        if job.masks:
+            for k, name in enumerate(['mask_nodata', 'mask_rice', 'mask_trees', 'mask_water', 'mask_other']):
+                paths[name] = os.path.join(output_path, name+output_suffix)
+                mask = lambda w, k=k: (S1_dataset_ricemap[w.row_off:w.row_off+w.height, :] == k).view(np.uint8)
+                saveBlocksToGTiff(mask, full_shape, paths[name], projection, transform, dstSRS, np.uint8, 0, compressor, None, ['NBITS=1']+geotiff_options)
+        del temporal_mean, temporal_max_increase, temporal_min, temporal_max, S1_dataset_ricemap
+        
+        elapsed = time.time() - start_time
+        print()
+        print("Rice classification completed... Δt = %.6s seconds" % elapsed)
+        print('Memory peak: %.3fG'%monitor.get_peak_memory_gb())
+        print()
+        
+        metrics = {'dates': depth, 'shape': tuple(full_shape), 'blocks': len(windows),
+                   'block_shape': (windows[0].height, windows[0].width), 'read_blocks': read_blocks,
+                   'engine': job.engine, 'threads': job.threads, 'seconds': elapsed,
+                   'memory_estimated_gb': memory_estimated / 1024**3, 'memory_peak_gb': monitor.get_peak_memory_gb()}
+        return RicemapResult(paths, metrics)
+    finally:
+        # reader is stopped before I/O pool is terminated, it may wait for reads of the block in the pool
+        if reader is not None:
+            reader.stop()
+        monitor.stop()
+        if DISABLE_GARBAGE_COLLECTOR:
+            gc.collect()
+            gc.enable()
+        for pool in (thread_pool, io_pool):
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        for dataset in datasets:
+            dataset.close()
+        if scratch_path is not None:
+            shutil.rmtree(scratch_path, ignore_errors=True)
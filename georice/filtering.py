@@ -1,5 +1,5 @@
 from subprocess import Popen, DEVNULL
-from .utils import load_config
+from .utils import Config
 import os
 import psutil
 import time
@@ -10,16 +10,23 @@ from datetime import datetime
 class Filtering:
     """ This module runs multitemporal speckle filtering processor """
 
-    def __init__(self):
-        config = load_config()
+    def __init__(self, config=None):
+        """
+        :param config: Config, snapshot of config file, default actual content of config file
+        """
+        self.set_config(config or Config.load())
+        self.name = ''
+        self.stdoutfile = DEVNULL
+        self.stderrfile = open("S1ProcessorErr.log", 'a')
+
+    def set_config(self, config):
+        """Use given snapshot of config file"""
+        self.config = config
         self.output = config['output']
         self.year_outcore_list = config['year_outcore_list']
-        self.name = ''
         self.ram_per_process = int(config['ram_per_process']*psutil.cpu_count()/2)
         self.OTBThreads = int(config['OTBThreads']*psutil.cpu_count()/2)
         self.Window_radius = config['Window_radius']
-        self.stdoutfile = DEVNULL
-        self.stderrfile = open("S1ProcessorErr.log", 'a')
 
     def process(self, name, orbit_path):
 
@@ -1,15 +1,23 @@
-import concurrent.futures
+import hashlib
 import os
+import warnings
 from datetime import datetime
 from urllib.parse import urlencode
 from rasterio import open as raster_open
 from rasterio.transform import Affine
+from rasterio.windows import Window
 from rasterio.warp import calculate_default_transform
 from rasterio.features import rasterize
-from requests import get
-from sentinelhub import BBox, SentinelHubRequest, SHConfig, MimeType
-from itertools import repeat
-from .utils import load_config, load_sh
+from rasterio.shutil import copy as raster_copy
+from sentinelhub import BBox, SentinelHubRequest, MimeType
+from sentinelhub.decoding import decode_data
+from .utils import Config, load_sh
+from .download import DownloadScheduler, DownloadPlan, DownloadJournal, FULL, EMPTY
+from .cache import TileCache
+from .catalog import SceneCatalog
+from .session import SentinelSession
+from .storage import SceneStorage
+from .cube import SceneCube
 from pyproj import CRS, Transformer
 from shapely.ops import transform
 from shapely.geometry import Polygon, MultiPolygon, shape
@@ -17,39 +25,73 @@ from shapely.wkt import loads
 from shapely.geometry.base import BaseGeometry
 from math import ceil, log10
 from copy import deepcopy
+from collections import Counter
 import numpy
 
 
 class GetSentinel:
+    # COG creation options of supported codecs of scene files, LERC with zero error is lossless
+    CODECS = {'deflate': {'compress': 'deflate', 'predictor': 'floating_point'},
+              'zstd': {'compress': 'zstd', 'predictor': 'floating_point'},
+              'lerc': {'compress': 'lerc', 'max_z_error': 0}}
 
-    def __init__(self):
+    def __init__(self, config=None):
+        """
+        :param config: Config, snapshot of config file, default actual content of config file
+        """
         self.SHConfig = load_sh()
         self.period = []
         self.tile_name = ''
         self.fld_name = ''
-        self._scenes = []
+        self._table = SceneTable([])
         self.aoi = None
         self.epsg = None
         self.nodata = -999
-        self.lx = self.config.get('img_width')*self.config.get('resolution')
-        self.ly = self.config.get('img_height')*self.config.get('resolution')
+        self.set_config(config or Config.load())
         self.wsf_offset = 0
-
-    @property
-    def config(self):
-        return load_config()
+        self.download_report = {}
+        self.cache = None
+        self._nodata_tiles = {}
+        self._session = None
 
     @property
     def resolution(self):
-        return load_config().get('resolution')
+        return self.config.get('resolution')
 
     @property
     def polar_modes(self):
-        return load_config().get('polar_modes')
+        return self.config.get('polar_modes')
+
+    @property
+    def storage(self):
+        """Storage format of scene files given by config key storage"""
+        return SceneStorage(self.config.get('storage', 'float32'), self.nodata)
+
+    def set_config(self, config):
+        """Use given snapshot of config file"""
+        self.config = config
+        self.lx = config.get('img_width')*config.get('resolution')
+        self.ly = config.get('img_height')*config.get('resolution')
 
     def __copy__(self):
         return deepcopy(self)
 
+    @property
+    def session(self):
+        """HTTP session of Sentinel Hub, it is created again if SHConfig was replaced"""
+        if self._session is None or self._session.config is not self.SHConfig:
+            self._session = SentinelSession(self.SHConfig, pool_size=self.config.get('max_workers', 8))
+        return self._session
+
+    @property
+    def _scenes(self):
+        """List of found scenes, Scene objects are created from scene table on demand"""
+        return self._table.scenes()
+
+    @_scenes.setter
+    def _scenes(self, scenes):
+        self._table = SceneTable.from_scenes(scenes)
+
     def scenes(self):
         """Return string representation of found scenes"""
         if len(self._scenes) == 0:
@@ -69,7 +111,7 @@ class GetSentinel:
                folder of the same name
         :param info: bool, turn off/on writing down list of found scenes
         """
-        self._scenes = []
+        self._table = SceneTable([])
         self.epsg = epsg
         self.aoi = Geometry.from_bbox(bbox, epsg)
 
@@ -78,29 +120,62 @@ class GetSentinel:
         self.aoi.round_geom(-int(log10(self.resolution)))
         self.period = [datetime.strptime(time, '%Y%m%d') for time in period]
 
-        while True:
-            self._scenes += [Scene(scene) for scene in self.search_archive().get('features')]
-            if len(self._scenes) >= self.wsf_offset:
-                self.wsf_offset += 100
+        self._table = SceneTable(self.search_catalog(self.period)).filter(polar='DV')
+
+    def search_catalog(self, period):
+        """
+        Return WFS features of AOI for given period. If config key catalog is set, features are kept in local catalog
+        output/.catalog.sqlite and Sentinel Hub is queried only for time not covered by previous searches.
+        """
+        if not self.config.get('catalog', True):
+            return self.search_pages(period)
+
+        catalog = SceneCatalog(os.path.join(self.config.get('output'), '.catalog.sqlite'))
+        missing = catalog.missing(self.aoi, period)
+        if len(missing) == 0:
+            print('Scenes were found in local catalog')
+        else:
+            try:
+                features = [feature for time_range in missing for feature in self.search_pages(time_range)]
+            except Exception as error:
+                if catalog.coverage(self.aoi) is None:
+                    raise
+                warnings.warn(f'Sentinel Hub WFS was not reached, scenes are taken from local catalog. Reason: {error}')
             else:
-                self.wsf_offset = 0
-                break
-        self._scenes = list(filter(lambda x: x.polar == 'DV', self._scenes))
+                catalog.update(self.aoi, missing, features)
+        return catalog.features(self.aoi, period)
+
+    def search_pages(self, period):
+        """
+        Return all WFS features of AOI for given period. If the first page is full, following pages are requested
+        concurrently.
+        """
+        page = 100
+        scheduler = DownloadScheduler(max_workers=self.config.get('max_workers', 8),
+                                      max_retries=self.config.get('max_retries', 3),
+                                      backoff=self.config.get('retry_backoff', 1.0))
+        features = self.search_archive(period, 0).get('features')
+        offset = page
+        while len(features) == offset:
+            offsets = range(offset, offset + page * scheduler.max_workers, page)
+            for response in scheduler.run(self.search_archive, [(period, start) for start in offsets]):
+                features += response.get('features')
+            offset += page * scheduler.max_workers
+        return features
 
     def filter(self, inplace, *args, **kwargs):
-        scenes = []
-        for name, value in kwargs.items():
-            if value is not None:
-                if isinstance(value, (tuple, list)):
-                    for val in value:
-                        scenes += list(filter(lambda x: x.__getattribute__(name) == val, self._scenes))
-                else:
-                    scenes += list(filter(lambda x: x.__getattribute__(name) == value, self._scenes))
+        """
+        Filter found scenes by keyword arguments {scene attribute: value or list of values}. Scene is kept if it
+        matches all given attributes, None values are ignored. Chronological order of scenes is kept.
+        :param inplace: bool, if True, found scenes are replaced by the result and self is returned
+        :return: list of scenes or self
+        """
+        table = self._table.filter(**kwargs)
         if inplace:
-            self._scenes = list(set(scenes))
+            self._table = table
             return self
         else:
-            return list(set(scenes))
+            return table.scenes()
 
     def set_tile_name(self, tile_name, part):
         if tile_name.find('_') < 0:
@@ -110,136 +185,305 @@ class GetSentinel:
             raise ValueError('Tile name cannot contain underscore character "_". Underscore character is used to split '
                          'scene meta data writen into resulting scene name')
 
-    def download(self, tile_name='Tile', part=''):
+    def download(self, tile_name='Tile', part='', journal=None):
+        """
+        Download tiles of all scenes and polarizations concurrently. Number of parallel requests, retries and retry
+        backoff are given by config keys max_workers, max_retries and retry_backoff. If config key multiband_request
+        is set, all polarizations of a tile are fetched by a single request. If config key data_mask is set, pixels
+        outside of scene footprint are taken from dataMask band instead of rasterization of the footprint.
+        Scene files recorded in the download journal of the tile are not downloaded again. Scenes of the same name,
+        i.e. slices of one pass acquired on the same date, are merged into one scene file.
+        :param journal: DownloadJournal recording downloaded scene files, default journal of scenes of the tile
+        """
         self.set_tile_name(tile_name, part)
+        self.aoi.grid_length = (self.lx, self.ly)
+        nx, ny = self.aoi.grid_size
+        grid = list(self.aoi.iter())
+        windows = self.grid_windows(grid, nx, self.resolution)
+        height = sum(window.height for window in windows[::nx])
+        width = sum(window.width for window in windows[:nx])
+
+        if self.config.get('multiband_request', True):
+            polar_groups = [tuple(self.polar_modes)]
+        else:
+            polar_groups = [(mode,) for mode in self.polar_modes]
+
+        if journal is None:
+            journal = self.journal()
+        storage = self.storage
+        skipped = 0
 
+        # empty cells are not requested at all, they are filled by nodata when the scene file is closed
+        plan = DownloadPlan(grid)
+        jobs, done = [], set()
         for scene in self._scenes:
-            debug = True
-            self.aoi.grid_length = (self.lx, self.ly)
-            nx, ny = self.aoi.grid_size
-            for mode in self.polar_modes:
-                scene.polar = mode
-                if debug:
-                    tiles = [self.download_tiles(scene, grid) for grid in self.aoi.iter()]
-                else:
-                    with concurrent.futures.ThreadPoolExecutor() as pool:
-                        results = pool.map(self.download_tiles, repeat(scene), [grid for grid in iter(self.aoi)])
-                        tiles = [res for res in results]
-
-                blocks = [tiles[i:i + nx] for i in range(0, len(tiles), nx)]
-                array = numpy.block(blocks)
-
-                name = self.scene_name(scene, self.tile_name)
-                self.save_raster(array, name)
-                del tiles, array
+            states = plan.classify(scene.geometry)
+            for polars in polar_groups:
+                paths = [self.scene_file(scene, mode) for mode in polars]
+                if all(path in done or journal.file_done(path) for path in paths):
+                    done.update(paths)
+                    continue
+                jobs += [(scene, polars, index, grid[index], state) for index, state in enumerate(states)
+                         if state != EMPTY]
+        if len(done) > 0:
+            print(f'{len(done)} scene files were already downloaded')
+
+        # tiles expected by scene files, a tile of each scene of the same name is expected for shared grid cells
+        expected = {}
+        for scene, polars, index, _, _ in jobs:
+            for mode in polars:
+                expected.setdefault(self.scene_file(scene, mode), []).append(index)
+        writers = {}
+
+        def collect(job, bands):
+            scene, polars, index, _, _ = job
+            for mode in polars:
+                path = self.scene_file(scene, mode)
+                if path not in writers:
+                    writers[path] = TileWriter(path, self.raster_profile(height, width), windows, expected[path],
+                                               self.cog_options(), storage)
+                writer = writers[path]
+                writer.write(index, bands[mode])
+                if writer.finished:
+                    if self.config.get('cube', False):
+                        self.scene_cube(scene, mode, height, width).append(writer.path)
+                    journal.complete_file(writer.path)
+                    del writers[path]
+
+        if self.config.get('cache', True):
+            self.cache = TileCache(os.path.join(self.config.get('output'), '.cache'),
+                                   self.config.get('cache_size', 10e9))
+        else:
+            self.cache = None
+
+        scheduler = DownloadScheduler(max_workers=self.config.get('max_workers', 8),
+                                      max_retries=self.config.get('max_retries', 3),
+                                      backoff=self.config.get('retry_backoff', 1.0))
+        try:
+            scheduler.run(self.download_job, jobs, collect)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        self.download_report = scheduler.report()
+        scheduler.show_report()
+        self.session.show_report()
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f'Tile cache: {stats["hits"]} hits, {stats["misses"]} misses, '
+                  f'{stats["bytes_saved"] / 1e6:.1f} MB not downloaded')
+
+    def journal(self, task='scenes'):
+        """Return download journal of given kind of job of the actual tile"""
+        return DownloadJournal.of_tile(os.path.join(self.config.get('output'), self.fld_name), task)
+
+    def scene_cube(self, scene, polar, height, width):
+        """
+        Return temporal cube of scenes of the same orbit and polarization as given scene, cube is created again if it
+        does not exist or the grid of scenes was changed
+        """
+        name = '_'.join([self.tile_name, scene.orbit_path, scene.rel_orbit_num, polar])
+        cube = SceneCube(os.path.join(self.config.get('output'), self.fld_name, 'cube', name))
+        profile = self.raster_profile(height, width)
+        if not cube.exists() or cube.shape != (profile['height'], profile['width']) \
+                or cube.transform != profile['transform'] or cube.storage.format != self.storage.format:
+            cube.create(profile['height'], profile['width'], profile['transform'], profile['crs'], self.storage,
+                        self.config.get('cube_chunk_size', 4096))
+        return cube
+
+    def scene_file(self, scene, polar):
+        """Return path of scene file of given polarization"""
+        return os.path.join(self.scene_path(), self.scene_name(scene, self.tile_name, polar))
+
+    @staticmethod
+    def grid_windows(grid, nx, resolution):
+        """Return list of raster windows of grid cells, grid cells are ordered by rows"""
+        shapes = [tuple(int(length / resolution) for length in cell[1]) for cell in grid]
+        col_offsets = [sum(x for x, _ in shapes[:col]) for col in range(nx)]
+        row_offsets = [sum(y for _, y in shapes[:row * nx:nx]) for row in range(len(shapes) // nx)]
+        return [Window(col_offsets[index % nx], row_offsets[index // nx], x, y) for index, (x, y) in enumerate(shapes)]
+
+    def download_job(self, scene, polars, index, grid, state=None):
+        return self.download_tiles(scene, grid, polars, state)
 
     @staticmethod
-    def scene_name(scene, tile_name):
+    def scene_name(scene, tile_name, polar=None):
         # satellite_tile-name_polarization_path_relative-orbit-number_date-txxxxxx.tif
-        return '_'.join([scene.satellite, tile_name, scene.polar, scene.orbit_path,
+        return '_'.join([scene.satellite, tile_name, polar or scene.polar, scene.orbit_path,
                          scene.rel_orbit_num, scene.from_time.strftime('%Y%m%d'), 'txxxxxx.tif'])
 
-    def download_tiles(self, scene, grid):
+    def download_tiles(self, scene, grid, polars=None, state=None):
+        """
+        Download tile of scene given by grid cell
+        :param scene: Scene
+        :param grid: tuple (bbox, shape) of grid cell
+        :param polars: tuple of polarizations, default polarization of scene
+        :param state: coverage of grid cell by scene as classified by DownloadPlan, if None it is computed
+        :return: dictionary {polarization: array}
+        """
+        polars = polars or (scene.polar,)
         bbox, shape = grid
         x, y = map(lambda coor: int(coor/self.resolution), shape)
-        if scene.geometry.intersects(bbox):
-            array = self.request(scene, bbox, (x, y))
-
-            diff = bbox.difference(scene.geometry)
-            if diff.area != 0:
-                x0, _, _, ye = bbox.bounds
-                transform = Affine(a=self.resolution, b=0, c=x0, d=0, e=-self.resolution, f=ye)
-                mask = rasterize([(diff, True)], out_shape=(y, x), transform=transform, fill=False,
-                                 all_touched=True)
-                array = numpy.where(mask, self.nodata, array)
+        if state is None:
+            state = DownloadPlan([grid]).classify(scene.geometry)[0]
+
+        bands = None
+        if state != EMPTY:
+            bands = self.request(scene, bbox, (x, y), polars)
+
+        # pixels outside of scene are already set to nodata by dataMask band, if it is requested
+        if bands is not None and state != FULL and not self.config.get('data_mask', True):
+            x0, _, _, ye = bbox.bounds
+            mask = self.footprint_mask(bbox.difference(scene.geometry), (x0, ye), self.resolution, (y, x))
+            if mask is not None:
+                bands = {polar: numpy.where(mask, self.nodata, array) for polar, array in bands.items()}
+
+        if bands is not None:
+            return bands
         else:
-            array = None
+            return {polar: self.nodata_tile((x, y)) for polar in polars}
 
-        if array is not None:
-            return array
-        else:
-            return self.nodata_tile((x, y))
+    @staticmethod
+    def footprint_mask(outside, upper_left, resolution, shape):
+        """Return boolean array of pixels touched by geometry outside of scene footprint or None if it is empty"""
+        if outside.is_empty or outside.area == 0:
+            return None
+        x0, y0 = upper_left
+        transform = Affine(a=resolution, b=0, c=x0, d=0, e=-resolution, f=y0)
+        return rasterize([(outside, 1)], out_shape=shape, transform=transform, fill=0, all_touched=True,
+                         dtype='uint8').view(bool)
 
     def nodata_tile(self, shape):
+        """Return read-only nodata tile, tiles of the same shape share one buffer"""
         x, y = shape
-        return numpy.ones(shape=(y, x)).astype('float32')*self.nodata
+        if (x, y) not in self._nodata_tiles:
+            tile = numpy.full((y, x), self.nodata, dtype='float32')
+            tile.setflags(write=False)
+            self._nodata_tiles[(x, y)] = tile
+        return self._nodata_tiles[(x, y)]
 
-    def request(self, scene, bbox, shape):
-        x, y = shape
-        evalscript = '''//VERSION=3
+    @staticmethod
+    def evalscript(polars, data_mask=False):
+        """Return evalscript returning bands of given polarizations and optionally dataMask as last band"""
+        bands = list(polars) + (['dataMask'] if data_mask else [])
+        return '''//VERSION=3
                     function setup() {
                       return {
-                        input: ["POLAR"],
-                        output: { id:"default", bands: 1, sampleType: SampleType.FLOAT32}
+                        input: [INPUT],
+                        output: { id:"default", bands: COUNT, sampleType: SampleType.FLOAT32}
                       }
                     }
-            
+
                     function evaluatePixel(samples) {
-                      return [samples.POLAR]
-                    }'''.replace('POLAR', scene.polar)
+                      return [SAMPLES]
+                    }'''.replace('INPUT', ', '.join(f'"{band}"' for band in bands))\
+            .replace('COUNT', str(len(bands)))\
+            .replace('SAMPLES', ', '.join(f'samples.{band}' for band in bands))
 
-        request = SentinelHubRequest(
-            evalscript=evalscript,
-            input_data=[
-                {
-                    "type": "S1GRD",
-                    "dataFilter": {
-                        "timeRange": {
-                            "from": scene.from_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-                            "to": scene.to_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-                        },
-                        "acquisitionMode": "IW",
-                        "polarization": "DV",
-                        "orbitDirection ": scene.orbit_path
+    def request(self, scene, bbox, shape, polars=None):
+        """
+        Request tile of scene for all given polarizations at once
+        :return: dictionary {polarization: array} or None
+        """
+        x, y = shape
+        polars = polars or (scene.polar,)
+        data_mask = self.config.get('data_mask', True)
+
+        evalscript = self.evalscript(polars, data_mask)
+        input_data = [
+            {
+                "type": "S1GRD",
+                "dataFilter": {
+                    "timeRange": {
+                        "from": scene.from_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        "to": scene.to_time.strftime('%Y-%m-%dT%H:%M:%SZ')
                     },
-                    "processing": {
-                        "backCoeff": "GAMMA0_ELLIPSOID",
-                        "orthorectify": "true"
-                    }
+                    "acquisitionMode": "IW",
+                    "polarization": "DV",
+                    "orbitDirection ": scene.orbit_path
+                },
+                "processing": {
+                    "backCoeff": "GAMMA0_ELLIPSOID",
+                    "orthorectify": "true"
                 }
+            }
 
-            ],
+        ]
+
+        key = None
+        if self.cache is not None:
+            key = TileCache.key(input_data=input_data, bbox=bbox.bounds, crs=self.aoi.crs.to_epsg(), size=(x, y),
+                                evalscript=hashlib.sha256(evalscript.encode()).hexdigest())
+            array = self.cache.get(key)
+            if array is not None:
+                return self.split_bands(array, polars, data_mask)
+
+        request = SentinelHubRequest(
+            evalscript=evalscript,
+            input_data=input_data,
             responses=[
                 SentinelHubRequest.output_response('default', MimeType.TIFF, )
             ],
             bbox=BBox(bbox, self.aoi.crs.to_epsg()),
             size=(x, y),
-            config=SHConfig()
+            config=self.SHConfig
         )
 
-        array = request.get_data(max_threads=min(32, os.cpu_count() + 4))[0]
-        if array is not None:
-            return array
-        else:
+        # request is sent by the shared session, so connections and token are reused by all download threads
+        download = request.download_list[0]
+        response = self.session.post(download.url, json=download.post_values, headers=download.headers)
+        if response.status_code != 200:
+            raise Exception(f'Sentinel Hub process request failed. Reason: {response.status_code}')
+        array = decode_data(response.content, MimeType.TIFF)
+        if array is None:
             return None
-
-    def search_archive(self):
+        if key is not None:
+            self.cache.put(key, array)
+        return self.split_bands(array, polars, data_mask)
+
+    def split_bands(self, array, polars, data_mask=False):
+        """Split multi-band response (height, width, bands) into dictionary {polarization: array}"""
+        array = numpy.atleast_3d(array)
+        if data_mask:
+            nodata = array[:, :, len(polars)] == 0
+            return {polar: numpy.where(nodata, self.nodata, array[:, :, i]).astype('float32')
+                    for i, polar in enumerate(polars)}
+        return {polar: array[:, :, i] for i, polar in enumerate(polars)}
+
+    def search_archive(self, period=None, offset=None):
         """ Collects data from WFS service
+        :param period: list [start, end] of datetime, default self.period
+        :param offset: int, feature offset, default self.wsf_offset
         :return: list o scenes properties for given input parameters
         :rtype: list
         """
-        main_url = '{}/{}?'.format('https://services.sentinel-hub.com/ogc/wfs', self.SHConfig.instance_id)
+        period = self.period if period is None else period
+        offset = self.wsf_offset if offset is None else offset
+        main_url = '{}/ogc/wfs/{}?'.format(self.SHConfig.sh_base_url, self.SHConfig.instance_id)
         params = {
             'REQUEST': 'GetFeature',
             'TYPENAMES': 'DSS3',
             'BBOX': ','.join(map(str, self.aoi.bbox)),
             'OUTPUTFORMAT': 'application/json',
             'SRSNAME': f'{self.aoi.crs}'.upper(),
-            'TIME': '/'.join([p.isoformat() for p in self.period]),
+            'TIME': '/'.join([p.isoformat() for p in period]),
             'MAXCC': 100.0 * 100,
             'MAXFEATURES': 100,
-            'FEATURE_OFFSET': self.wsf_offset,
+            'FEATURE_OFFSET': offset,
             'VERSION': self.config.get('wsf_version')
         }
         url = main_url + urlencode(params)
-        response = get(url)
+        response = self.session.get(url)
         if response.status_code == 200:
             return response.json()
         else:
             raise Exception(f'Connection to Sentinel Hub WSF failed. Reason: {response.status_code}')
 
-    def save_raster(self, array, name):
-        height, width = array.shape
+    def raster_profile(self, height, width):
+        """
+        Return rasterio profile of uncompressed scene raster of given size, it is tiled by blocks of config key
+        block_size. Final scene file is its copy written by cog_options.
+        """
+        block_size = self.config.get('block_size', 1024)
         if self.aoi.crs.to_epsg() == self.epsg:
             x, y = self.aoi.upper_left
             transform = Affine(a=self.resolution, b=0, c=x, d=0, e=-self.resolution, f=y)
@@ -252,21 +496,116 @@ class GetSentinel:
             transform, width, height = calculate_default_transform(src, dst, width, height, left=left, bottom=bottom,
                                                                    right=right, top=top, dst_width=width,
                                                                    dst_height=height)
-        profile = {'driver': 'GTiff',
-                    'dtype': 'float32',
-                   'nodata': self.nodata,
-                   'width': width,
-                   'height': height,
-                   'count': 1,
-                   'crs': f'http://www.opengis.net/def/crs/EPSG/0/{self.epsg}',
-                   'transform': transform}
-
+        return {'driver': 'GTiff',
+                **self.storage.profile(),
+                'width': width,
+                'height': height,
+                'count': 1,
+                'crs': f'http://www.opengis.net/def/crs/EPSG/0/{self.epsg}',
+                'transform': transform,
+                'tiled': True,
+                'blockxsize': block_size,
+                'blockysize': block_size,
+                'bigtiff': 'if_safer'}
+
+    def cog_options(self):
+        """
+        Return creation options of cloud optimized GeoTIFF of scene. Block size given by config key block_size
+        divides the processing block of ricemap, so its windowed reads decode only whole blocks. Codec is given by
+        config key compress, internal overviews are built if config key overviews is set. Options of quantized
+        storage override options of codec.
+        """
+        codec = self.config.get('compress', 'deflate').lower()
+        if codec not in self.CODECS:
+            raise Exception(f'Codec "{codec}" is not supported, use one of: {", ".join(self.CODECS)}')
+        return {'driver': 'COG',
+                'blocksize': self.config.get('block_size', 1024),
+                'overviews': 'auto' if self.config.get('overviews', False) else 'none',
+                'resampling': 'average',
+                'bigtiff': 'if_safer',
+                'num_threads': 'all_cpus',
+                **self.CODECS[codec],
+                **self.storage.cog_options(codec)}
+
+    def scene_path(self):
+        """Return folder of downloaded scenes, folder is created if it does not exist"""
         path = os.path.join(self.config.get("output"), self.fld_name, 'scenes')
         if not os.path.exists(path):
             os.makedirs(path, exist_ok=True)
+        return path
+
+    def save_raster(self, array, name):
+        height, width = array.shape
+        path = os.path.join(self.scene_path(), name)
+        storage = self.storage
+        with raster_open(path + '.part', "w", **self.raster_profile(height, width)) as dest:
+            storage.write_metadata(dest)
+            dest.write(storage.encode(array), 1)
+        raster_copy(path + '.part', path, **self.cog_options())
+        os.remove(path + '.part')
+
+
+class TileWriter:
+    """
+    GeoTIFF created up front for the whole scene. Tiles are written into their windows as soon as they arrive, so
+    the scene is never assembled in memory. Tiles are written into uncompressed staging file, blocks shared by
+    neighbouring tiles are rewritten in place there. After the last tile the staging file is copied into the output
+    file by given creation options and removed. Tiles are encoded by storage format of scene.
+
+    Several tiles may be expected for one window, e.g. from slices of the same pass which are written into one scene
+    file. They are kept until the last of them arrives and merged, nodata pixels are taken from the other tiles and
+    pixels covered by several tiles keep the maximum, so the result does not depend on the order of arrival.
+    """
+
+    def __init__(self, path, profile, windows, indices=None, options=None, storage=None):
+        """
+        :param path: str, path of output GeoTIFF
+        :param profile: dict, rasterio profile of staging GeoTIFF
+        :param windows: list of rasterio windows, one for each tile
+        :param indices: indices of tiles to be written, default all tiles. Index repeated n times expects n tiles
+        of its window to be merged. Windows of remaining tiles are left to be filled by nodata value
+        :param options: dict, driver and creation options of output GeoTIFF, default staging file is the output
+        :param storage: SceneStorage, storage format of scene, default tiles are written as they are
+        """
+        self.path = path
+        self.windows = windows
+        self.options = options
+        self._staging = path + '.part' if options else path
+        self._remaining = Counter(range(len(windows)) if indices is None else indices)
+        self._pending = {}
+        self.storage = storage
+        self.nodata = storage.nodata if storage is not None else profile.get('nodata')
+        self._dataset = raster_open(self._staging, 'w', **profile)
+        if storage is not None:
+            storage.write_metadata(self._dataset)
 
-        with raster_open(os.path.join(path, name), "w", **profile, compress='lzw') as dest:
-            dest.write(array, 1)
+    @property
+    def finished(self):
+        return len(self._remaining) == 0
+
+    def write(self, index, array):
+        """Write tile of given index into its window, file is closed after the last tile"""
+        if index in self._pending:
+            pending = self._pending.pop(index)
+            array = numpy.where(array == self.nodata, pending,
+                                numpy.where(pending == self.nodata, array, numpy.maximum(array, pending)))
+        self._remaining[index] -= 1
+        if self._remaining[index] > 0:
+            self._pending[index] = array
+            return
+        del self._remaining[index]
+        if self.storage is not None:
+            array = self.storage.encode(array)
+        self._dataset.write(array, 1, window=self.windows[index])
+        if self.finished:
+            self.close()
+            if self.options:
+                raster_copy(self._staging, self.path, **self.options)
+                os.remove(self._staging)
+
+    def close(self):
+        if not self._dataset.closed:
+            self._dataset.close()
 
 
 class Geometry:
@@ -536,6 +875,83 @@ class Geometry:
         return (minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy)
 
 
+class SceneTable:
+    """
+    Columnar table of scenes. Scene attributes are held in numpy structured array, so filtering is a vectorized
+    boolean mask keeping order of rows. Scene objects are created only when they are requested.
+    """
+
+    COLUMNS = [('satellite', 'U3'), ('polar', 'U2'), ('abs_orbit_num', 'U6'), ('rel_orbit_num', 'U3'),
+               ('orbit_path', 'U3'), ('from_time', 'datetime64[s]'), ('to_time', 'datetime64[s]'), ('bbox', 'f8', (4,))]
+
+    def __init__(self, features, scenes=None):
+        """
+        :param features: list of WFS geojson features or Scene objects
+        :param scenes: dictionary {row: Scene} of already created scenes
+        """
+        self._features = list(features)
+        self._scenes = {} if scenes is None else scenes
+        self.data = numpy.array([self._row(feature) for feature in self._features], dtype=self.COLUMNS)
+        self.rows = numpy.arange(len(self._features))
+
+    @classmethod
+    def from_scenes(cls, scenes):
+        scenes = list(scenes)
+        return cls(scenes, dict(enumerate(scenes)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.scenes())
+
+    @staticmethod
+    def _row(feature):
+        if isinstance(feature, Scene):
+            return (feature.satellite, feature.polar, feature.abs_orbit_num, feature.rel_orbit_num,
+                    feature.orbit_path, numpy.datetime64(feature.from_time, 's'),
+                    numpy.datetime64(feature.to_time, 's'), feature.bbox)
+        properties = feature.get('properties')
+        satellite, polar, abs_orbit_num, from_time, to_time = Scene._parsename(properties.get('id'))
+        bbox = feature.get('bbox') or shape(feature.get('geometry')).bounds
+        return (satellite, polar, abs_orbit_num, Scene.relative_orbit(satellite, abs_orbit_num),
+                properties.get('orbitDirection')[:3], numpy.datetime64(from_time, 's'),
+                numpy.datetime64(to_time, 's'), tuple(bbox[:4]))
+
+    def filter(self, **kwargs):
+        """
+        Return table of rows matching all keyword arguments {attribute: value or list of values}. Attributes out of
+        table columns are compared on Scene objects.
+        """
+        mask = numpy.ones(len(self.rows), dtype=bool)
+        for name, value in kwargs.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, (tuple, list)) else [value]
+            if name in self.data.dtype.names:
+                column = self.data[name][self.rows]
+                match = numpy.zeros(len(self.rows), dtype=bool)
+                # fields of several values (bbox) are equal if all their values are, shape is explicit for empty table
+                width = int(numpy.prod(self.data.dtype[name].shape))
+                for val in values:
+                    equal = column == numpy.array(val, dtype=self.data.dtype[name].base)
+                    match |= equal.reshape(len(self.rows), width).all(axis=1)
+            else:
+                match = numpy.array([getattr(scene, name) in values for scene in self.scenes()], dtype=bool)
+            mask &= match
+        table = SceneTable.__new__(SceneTable)
+        table._features, table._scenes, table.data = self._features, self._scenes, self.data
+        table.rows = self.rows[mask]
+        return table
+
+    def scenes(self):
+        """Return list of Scene objects of table rows"""
+        for row in self.rows:
+            if row not in self._scenes:
+                self._scenes[row] = Scene(self._features[row])
+        return [self._scenes[row] for row in self.rows]
+
+
 class Scene(Geometry):
     """
     Class to handle with SH scenes and their geometries
@@ -585,10 +1001,15 @@ class Scene(Geometry):
 
     @property
     def rel_orbit_num(self):
-        orbit_number = int(self.abs_orbit_num.lstrip('0'))
-        if self.satellite == 'S1A':
+        return self.relative_orbit(self.satellite, self.abs_orbit_num)
+
+    @staticmethod
+    def relative_orbit(satellite, abs_orbit_num):
+        """Return three digits relative orbit number of satellite for absolute orbit number"""
+        orbit_number = int(abs_orbit_num.lstrip('0'))
+        if satellite == 'S1A':
             rel_orbit_num = str(((orbit_number - 73) % 175) + 1)
-        elif self.satellite == 'S1B':
+        elif satellite == 'S1B':
             rel_orbit_num = str(((orbit_number - 27) % 175) + 1)
         while len(rel_orbit_num) < 3:
             rel_orbit_num = '0' + rel_orbit_num
@@ -1,14 +1,18 @@
-import subprocess
-from .utils import load_config
+from .utils import Config
+from .engine import RicemapJob, run
 import os
-import sys
-import georice
-from pathlib import Path
 
 class Ricemap:
 
-    def __init__(self):
-        config = load_config()
+    def __init__(self, config=None):
+        """
+        :param config: Config, snapshot of config file, default actual content of config file
+        """
+        self.set_config(config or Config.load())
+
+    def set_config(self, config):
+        """Use given snapshot of config file"""
+        self.config = config
         self.output = config['output']
 
     def ricemap_get(self, tile_name, orbit_number, period, direct, inter=False, lzw=False, mask=False, nr=False,
@@ -16,32 +20,26 @@ class Ricemap:
         """
         Set ricemap commands.
         NOTE: starting_date / ending_date => YYYYMMDD, inclusive
+        If config key cube is set and scenes are not filtered, time series are read from temporal cube of the tile.
+        Temporal statistics are computed by engine given by config key engine, memory is limited by config keys
+        out_of_core and max_memory_gb.
+        Rice map is processed in current process by georice.engine, compiled kernels are reused by next calls.
+        :return: RicemapResult, paths of written products and metrics of processing
         """
         scene_path = os.path.join(self.output, tile_name, folder)
         output_path = os.path.join(self.output, tile_name)
-        script = Path(georice.__file__).parent.parent / 'bin' / 'ricemap.py'
-        args = [sys.executable, str(script), scene_path, orbit_number, period[0], period[1], output_path]
-        if direct:
-            args.append('-d ')
-            args.append(direct)
-        if inter:
-            args.append('-i')
-        if lzw:
-            args.append('-lzw')
-        if mask:
-            args.append('-m')
-        if nr:
-            args.append('-nr')
-        args.append(part)
-
+        cube_path = os.path.join(output_path, 'cube', '_'.join([part + tile_name, direct or 'DES', orbit_number, 'VH']))
+        if not (folder == 'scenes' and self.config.get('cube', False) and os.path.isdir(cube_path)):
+            cube_path = None
+        job = RicemapJob(scene_path, orbit_number, period[0], period[1], output_path, direction=direct or 'DES',
+                         intermediate=inter, lzw=lzw, masks=mask, reproject=not nr, cube_path=cube_path,
+                         engine=self.config.get('engine'),
+                         out_of_core=self.config.get('out_of_core', False),
+                         max_memory_gb=self.config.get('max_memory_gb', 0))
         try:
-            p = subprocess.check_output(args=' '.join(args), shell=True)
-        except subprocess.CalledProcessError as e:
+            result = run(job)
+        except Exception:
             print("Ricemap classificator wasn't executed successfully")
-            print(e.output.decode())
-            quit()
-        print(p.decode())
+            raise
         print(f'Rice map was generated into the folder {self.output}{os.sep}{tile_name}{os.sep}ricemaps')
-
-
-
+        return result
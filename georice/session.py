@@ -0,0 +1,130 @@
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+class SentinelSession:
+    """
+    HTTP session of Sentinel Hub shared by all threads of GetSentinel. Connections are kept alive in a pool of the
+    size of download workers and one OAuth token is cached for all requests, it is refreshed shortly before expiry.
+
+    Requests time out after download_timeout_seconds of SHConfig. Requests rejected by rate limit (HTTP 429) are
+    repeated after the delay of Retry-After header, so they do not use up retries of failed download jobs.
+    """
+
+    def __init__(self, config, pool_size=8, refresh_before_expiry=120, rate_limit_retries=20, rate_limit_backoff=1.0):
+        """
+        :param config: sentinelhub.SHConfig with credentials and service urls
+        :param pool_size: int, max number of kept alive connections per host
+        :param refresh_before_expiry: float, token is refreshed this number of seconds before it expires
+        :param rate_limit_retries: int, number of repetitions of request rejected by rate limit
+        :param rate_limit_backoff: float, delay in seconds before the first repetition without Retry-After header,
+        doubled with every next one up to 60 seconds
+        """
+        self.config = config
+        self.refresh_before_expiry = refresh_before_expiry
+        self.timeout = getattr(config, 'download_timeout_seconds', None) or 120
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limit_backoff = rate_limit_backoff
+        self.http = Session()
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.http.mount('https://', self._adapter)
+        self.http.mount('http://', self._adapter)
+        self._token = None
+        self._expires_at = 0
+        self._lock = Lock()
+        self.token_refreshes = 0
+        self.auth_time = 0.0
+        self.throttled = 0
+        self._stats_lock = Lock()
+
+    def __deepcopy__(self, memo):
+        # copies of GetSentinel share connections and token
+        return self
+
+    @property
+    def token_url(self):
+        token_url = getattr(self.config, 'sh_token_url', None)
+        return token_url or self.config.sh_auth_base_url + '/oauth/token'
+
+    def token(self):
+        """Return valid access token, token is fetched only by one thread at time"""
+        with self._lock:
+            if self._token is None or time.time() > self._expires_at - self.refresh_before_expiry:
+                start = time.perf_counter()
+                response = self._send('post', self.token_url, data={'grant_type': 'client_credentials',
+                                                                    'client_id': self.config.sh_client_id,
+                                                                    'client_secret': self.config.sh_client_secret})
+                self.auth_time += time.perf_counter() - start
+                if response.status_code != 200:
+                    raise Exception(f'Authentication to Sentinel Hub failed. Reason: {response.status_code}')
+                token = response.json()
+                self._token = token['access_token']
+                self._expires_at = token.get('expires_at') or time.time() + token.get('expires_in', 3600)
+                self.token_refreshes += 1
+            return self._token
+
+    def invalidate(self):
+        """Drop cached token, the next request fetches a new one"""
+        with self._lock:
+            self._token = None
+
+    def retry_after(self, response, attempt):
+        """Return delay in seconds before repetition of request rejected by rate limit"""
+        value = response.headers.get('Retry-After')
+        if value is not None:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return min(60.0, self.rate_limit_backoff * 2 ** attempt)
+
+    def _send(self, method, url, **kwargs):
+        # requests rejected by rate limit are repeated, the last response is returned to the caller
+        for attempt in range(self.rate_limit_retries + 1):
+            response = self.http.request(method, url, timeout=self.timeout, **kwargs)
+            if response.status_code != 429 or attempt == self.rate_limit_retries:
+                return response
+            with self._stats_lock:
+                self.throttled += 1
+            time.sleep(self.retry_after(response, attempt))
+
+    def get(self, url, **kwargs):
+        """GET request without authentication, e.g. WFS queried by instance id"""
+        return self._send('get', url, **kwargs)
+
+    def post(self, url, json=None, headers=None):
+        """Authenticated POST request, it is repeated once with a new token if the token was rejected"""
+        for attempt in range(2):
+            response = self._send('post', url, json=json,
+                                  headers={**(headers or {}), 'Authorization': f'Bearer {self.token()}'})
+            if response.status_code != 401:
+                break
+            self.invalidate()
+        return response
+
+    def report(self):
+        """
+        Return dictionary with number of HTTP requests, opened connections, ratio of requests served by already
+        opened connection, number of token refreshes, time spent on authentication in seconds and number of requests
+        rejected by rate limit
+        """
+        pools = self._adapter.poolmanager.pools
+        pools = [pools[key] for key in pools.keys()]
+        requests = sum(pool.num_requests for pool in pools)
+        connections = sum(pool.num_connections for pool in pools)
+        return {'requests': requests, 'connections': connections,
+                'reuse': 1 - connections / requests if requests else 0.0,
+                'token_refreshes': self.token_refreshes, 'auth_time': self.auth_time, 'throttled': self.throttled}
+
+    def show_report(self):
+        report = self.report()
+        if report['requests'] > 0:
+            print(f'{report["requests"]} HTTP requests over {report["connections"]} connections '
+                  f'({report["reuse"]:.0%} reused), {report["token_refreshes"]} token refreshes, '
+                  f'authentication {report["auth_time"]:.2f}s, {report["throttled"]} requests throttled')
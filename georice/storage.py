@@ -0,0 +1,108 @@
+import numpy
+
+
+class SceneStorage:
+    """
+    Storage format of downloaded scene files given by config key storage:
+    - float32: linear gamma0 as returned by Sentinel Hub
+    - uint16: gamma0 in dB quantized into codes 1..65535 mapped to dB range [DB_MIN, DB_MAX] by scale and offset of
+      the band, code 0 is nodata. Step is 0.0012 dB, maximal error 0.0006 dB, i.e. 0.014 % of linear gamma0.
+    - float16: gamma0 in dB stored as 16-bit float. Maximal error is 0.008 dB (0.18 %) within -32..32 dB, 0.016 dB
+      (0.36 %) down to DB_MIN.
+    Gamma0 out of [DB_MIN, DB_MAX] is clipped. Band of quantized file has unit dB and tag GAMMA0=dB, readers applying
+    scale and offset of the band get gamma0 in dB.
+    """
+    FORMATS = ('float32', 'uint16', 'float16')
+    DB_MIN = -50.0
+    DB_MAX = 30.0
+
+    def __init__(self, format='float32', nodata=-999):
+        """
+        :param format: str, one of FORMATS
+        :param nodata: nodata value of linear gamma0
+        """
+        if format not in self.FORMATS:
+            raise Exception(f'Storage "{format}" is not supported, use one of: {", ".join(self.FORMATS)}')
+        self.format = format
+        self.nodata = nodata
+        self._table = None
+
+    @property
+    def quantized(self):
+        return self.format != 'float32'
+
+    @property
+    def scale(self):
+        return (self.DB_MAX - self.DB_MIN) / 65534 if self.format == 'uint16' else 1.0
+
+    @property
+    def offset(self):
+        # code 1 is DB_MIN, code 0 is left for nodata
+        return self.DB_MIN - self.scale if self.format == 'uint16' else 0.0
+
+    @property
+    def max_error(self):
+        """Maximal absolute error of stored gamma0 in dB"""
+        if self.format == 'uint16':
+            return self.scale / 2
+        if self.format == 'float16':
+            return float(numpy.spacing(numpy.float16(max(abs(self.DB_MIN), abs(self.DB_MAX))))) / 2
+        return 0.0
+
+    def profile(self):
+        """Return dtype and nodata of staging raster of scene"""
+        if self.format == 'uint16':
+            return {'dtype': 'uint16', 'nodata': 0}
+        return {'dtype': 'float32', 'nodata': self.nodata}
+
+    def cog_options(self, codec):
+        """Return COG creation options of storage overriding options of codec"""
+        if self.format == 'uint16':
+            return {'predictor': 'standard'} if codec != 'lerc' else {}
+        if self.format == 'float16':
+            if codec == 'lerc':
+                raise Exception('Storage float16 is not supported by codec lerc, use deflate or zstd')
+            return {'nbits': 16}
+        return {}
+
+    def encode(self, array):
+        """Encode linear gamma0 into stored values"""
+        if not self.quantized:
+            return array
+        valid = array != self.nodata
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            db = numpy.clip(10 * numpy.log10(array, dtype='float32'), self.DB_MIN, self.DB_MAX)
+        # zero and negative gamma0 are clipped to DB_MIN
+        db[numpy.isnan(db)] = self.DB_MIN
+        if self.format == 'uint16':
+            codes = numpy.rint((db - self.offset) / self.scale)
+            return numpy.where(valid, numpy.clip(codes, 1, 65535), 0).astype('uint16')
+        # GDAL truncates floats written into 16 bits, so they are rounded here
+        return numpy.where(valid, db.astype('float16'), self.nodata).astype('float32')
+
+    def lookup_table(self):
+        """Return linear gamma0 of all 16-bit codes (uint16 codes or bits of float16 dB)"""
+        codes = numpy.arange(65536, dtype='uint16')
+        db = codes * self.scale + self.offset if self.format == 'uint16' else codes.view('float16').astype('float32')
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            table = numpy.power(10, db / 10).astype('float32')
+        table[0 if self.format == 'uint16' else numpy.float16(self.nodata).view('uint16')] = self.nodata
+        return table
+
+    def decode(self, array):
+        """Decode stored values into linear gamma0, stored values are read by GDAL as uint16 or float32"""
+        if not self.quantized:
+            return array
+        if self.format == 'float16':
+            array = array.astype('float16').view('uint16')
+        if self._table is None:
+            self._table = self.lookup_table()
+        return self._table[array]
+
+    def write_metadata(self, dataset):
+        """Write scale, offset and unit of stored values into opened rasterio dataset"""
+        if self.quantized:
+            dataset.scales = (self.scale,)
+            dataset.offsets = (self.offset,)
+            dataset.units = ('dB',)
+            dataset.update_tags(1, GAMMA0='dB')
@@ -1,6 +1,7 @@
 from sentinelhub import SHConfig
 import os, shutil
 import json
+from collections.abc import Mapping
 import warnings
 from rasterio import open as rio_open
 from rasterio.merge import merge
@@ -84,6 +85,57 @@ def load_config():
         return json.load(cfg_file)
 
 
+class Config(Mapping):
+    """
+    Immutable snapshot of the config file taken once per run. Components keep the snapshot instead of reading the
+    config file on every access, so edits of the file during a run are not seen until the snapshot is reloaded.
+    """
+
+    def __init__(self, values, path=None, mtime=None):
+        """
+        :param values: dict, config values
+        :param path: str, path of config file of snapshot
+        :param mtime: float, modification time of config file when snapshot was taken
+        """
+        self._values = {key: tuple(value) if isinstance(value, list) else value for key, value in values.items()}
+        self.path = path
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls):
+        """Take snapshot of config file"""
+        config_file = os.path.join(os.path.dirname(__file__), 'config.json')
+        mtime = os.path.getmtime(config_file) if os.path.isfile(config_file) else None
+        return cls(load_config(), config_file, mtime)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f'Config({self._values})'
+
+    def changed(self):
+        """Return True if config file was modified since the snapshot was taken"""
+        return self.path is not None and os.path.isfile(self.path) and os.path.getmtime(self.path) != self.mtime
+
+    def reload(self):
+        """Return new snapshot if config file was modified, otherwise the snapshot itself"""
+        return self.load() if self.changed() else self
+
+    def replace(self, **values):
+        """Return copy of snapshot with given values replaced, config file is not modified"""
+        return Config({**self._values, **values}, self.path, self.mtime)
+
+
 def reset_config():
     config_file = os.path.join(os.path.dirname(__file__), 'config.json')
     if not os.path.isfile(config_file):
@@ -24,8 +24,9 @@ setup(
         'pyproj==2.4.1',
         'gdal',
         'psutil==5.7.0',
-        'numba==0.48.0',
-        'scikit-image==0.16.2'],
+        'scipy'],
+    extras_require={
+        'numba': ['numba==0.48.0']},
     zip_safe=False,
     package_data={"": ["*.json"]},
     include_package_data=True,
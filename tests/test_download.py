@@ -0,0 +1,87 @@
+import os
+from types import SimpleNamespace
+from georice import Georice
+from georice.download import DownloadJournal
+
+
+def test_journal_resumes_same_job(tmp_path):
+    path = str(tmp_path / '.journal')
+    journal = DownloadJournal(path)
+    assert not journal.start({'period': ('20200101', '20200131'), 'orbit_number': '018'})
+    journal.complete_part('part0-')
+
+    journal = DownloadJournal(path)
+    assert journal.start({'period': ['20200101', '20200131'], 'orbit_number': '018'})
+    assert journal.resumed and journal.part_done('part0-')
+
+
+def test_journal_discards_other_job(tmp_path):
+    path = str(tmp_path / '.journal')
+    journal = DownloadJournal(path)
+    journal.start({'period': ['20200101', '20200131'], 'orbit_number': '018'})
+    journal.complete_part('part0-')
+
+    journal = DownloadJournal(path)
+    assert not journal.start({'period': ['20200101', '20200229'], 'orbit_number': '018'})
+    assert not journal.part_done('part0-') and journal.stale_parts == {'part0-'}
+    reloaded = DownloadJournal(path)
+    assert reloaded.job == {'period': ['20200101', '20200229'], 'orbit_number': '018'} and not reloaded.parts
+
+
+def test_journal_without_job_is_discarded(tmp_path):
+    path = str(tmp_path / '.journal')
+    with open(path, 'w') as file:
+        file.write('{"unit": "part", "part": "part0-"}\n')
+    journal = DownloadJournal(path)
+    assert not journal.start({'orbit_number': '018'})
+    assert not journal.part_done('part0-')
+
+
+def test_georice_journal_mismatch_removes_stale_ricemaps(tmp_path):
+    georice = Georice.__new__(Georice)
+    georice.config = {'output': str(tmp_path), 'storage': 'float32'}
+    georice._imagery = SimpleNamespace(aoi=None, period=[], _scenes=[])
+    os.makedirs(tmp_path / 'Tile' / 'ricemaps')
+    stale = tmp_path / 'Tile' / 'ricemaps' / 'ricemap_part0-Tile_DES_018_20200101_20200131.tif'
+    other = tmp_path / 'Tile' / 'ricemaps' / 'ricemap_part1-Tile_DES_018_20200101_20200131.tif'
+    stale.touch()
+    other.touch()
+
+    journal = georice._journal('Tile', task='ricemap', period=['20200101', '20200131'])
+    journal.complete_part('part0-')
+    assert georice._journal('Tile', task='ricemap', period=['20200101', '20200131']).resumed
+    assert stale.exists()
+
+    journal = georice._journal('Tile', task='ricemap', period=['20200101', '20200229'])
+    assert not journal.resumed and not journal.parts
+    assert not stale.exists() and other.exists()
+
+
+def test_scenes_job_keeps_interrupted_ricemap(tmp_path):
+    georice = Georice.__new__(Georice)
+    georice.config = {'output': str(tmp_path), 'storage': 'float32'}
+    georice._imagery = SimpleNamespace(aoi=None, period=[], _scenes=[])
+    os.makedirs(tmp_path / 'Tile' / 'ricemaps')
+    ricemap = tmp_path / 'Tile' / 'ricemaps' / 'ricemap_part0-Tile_DES_018_20200101_20200131.tif'
+    ricemap.touch()
+    georice._journal('Tile', task='ricemap', period=['20200101', '20200131']).complete_part('part0-')
+
+    georice._journal('Tile', task='scenes').clear()
+
+    journal = georice._journal('Tile', task='ricemap', period=['20200101', '20200131'])
+    assert journal.resumed and journal.part_done('part0-') and ricemap.exists()
+
+
+def test_journal_detects_changed_file(tmp_path):
+    path = tmp_path / 'scene.tif'
+    path.write_bytes(os.urandom(300000))
+    journal = DownloadJournal(str(tmp_path / '.journal'))
+    journal.complete_file(str(path))
+    assert DownloadJournal(str(tmp_path / '.journal')).file_done(str(path))
+
+    with open(path, 'r+b') as file:
+        file.seek(-10, os.SEEK_END)
+        file.write(b'0123456789')
+    assert not DownloadJournal(str(tmp_path / '.journal')).file_done(str(path))
+    path.write_bytes(b'short')
+    assert not journal.file_done(str(path))
@@ -0,0 +1,81 @@
+import time
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from georice import engine
+from georice.engine import BlockReader
+from georice.storage import SceneStorage
+
+
+def windows(count):
+    return [Window(0, row, 4, 1) for row in range(count)]
+
+
+def test_block_reader_reads_blocks_in_order():
+    def read(window, buffer):
+        buffer[:] = window.row_off
+
+    reader = BlockReader(read, windows(5), [np.zeros(4) for _ in range(2)], timeout=0.05)
+    reader.start()
+    assert [(window.row_off, buffer[0]) for window, buffer in reader] == [(row, row) for row in range(5)]
+    reader.stop()
+    assert not reader.is_alive() and reader.daemon
+
+
+def test_block_reader_stops_when_consumer_fails():
+    reader = BlockReader(lambda window, buffer: None, windows(100), [np.zeros(4) for _ in range(2)], timeout=0.05)
+    reader.start()
+    with pytest.raises(ValueError):
+        for _ in reader:
+            raise ValueError('processing failed')
+    start = time.time()
+    reader.stop()
+    assert not reader.is_alive() and time.time() - start < 1
+
+
+def test_block_reader_raises_read_error():
+    def read(window, buffer):
+        if window.row_off == 1:
+            raise IOError('read failed')
+
+    reader = BlockReader(read, windows(3), [np.zeros(4)], timeout=0.05)
+    reader.start()
+    with pytest.raises(IOError):
+        list(reader)
+    reader.stop()
+
+
+def test_rice_mapping_without_numba_equals_fused(monkeypatch):
+    rng = np.random.default_rng(0)
+    size = 160
+    stats = [rng.uniform(low, high, (size // 8, size // 8)).repeat(8, 0).repeat(8, 1).astype(np.float32)
+             * rng.uniform(0.7, 1.3, (size, size)).astype(np.float32)
+             for low, high in [(0., 0.2), (1., 6.), (0.001, 0.03), (0.005, 0.1)]]
+    stats[0][rng.random((size, size)) < 0.01] = 0
+    expected = engine.rice_mapping_fused(*stats, engine.RICE_THRESHOLD_DB)
+    monkeypatch.setattr(engine, 'numba', None)
+    out = np.zeros((size, size), dtype=np.uint8)
+    for y in range(0, size, 64):
+        for x in range(0, size, 64):
+            engine.rice_mapping_block(Window(x, y, 64, 64), *stats, engine.RICE_THRESHOLD_DB, out)
+    assert np.array_equal(out, expected)
+    assert len(np.unique(out)) > 2
+
+
+@pytest.mark.parametrize('format', ['uint16', 'float16'])
+def test_read_gamma0_decodes_by_scene_storage(tmp_path, format):
+    storage = SceneStorage(format, -999)
+    gamma0 = np.random.default_rng(0).gamma(4.4, 0.05 / 4.4, (40, 30)).astype(np.float32)
+    gamma0[::7, ::5] = -999
+    path = str(tmp_path / 'scene.tif')
+    with rasterio.open(path, 'w', driver='GTiff', width=30, height=40, count=1, crs='EPSG:32648',
+                       transform=Affine(10, 0, 0, 0, -10, 0), **storage.profile()) as dataset:
+        storage.write_metadata(dataset)
+        dataset.write(storage.encode(gamma0), 1)
+    window = Window(3, 5, 20, 30)
+    with rasterio.open(path) as dataset:
+        expected = storage.decode(dataset.read(1, window=window))
+        assert np.array_equal(engine.read_gamma0(dataset, window), expected)
+    assert (expected == -999).any()
@@ -0,0 +1,72 @@
+import os
+import numpy
+from rasterio import open as raster_open
+from georice.imagery import GetSentinel, SceneTable
+from georice.utils import Config
+
+
+def feature(polar='DV', orbit_direction='DESCENDING', start='20200105T224500'):
+    name = f'S1A_IW_GRDH_1S{polar}_{start}_20200105T224525_030659_0383A6_1C4F'
+    return {'type': 'Feature', 'bbox': [0., 0., 10., 10.],
+            'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]],
+                         'crs': {'type': 'name', 'properties': {'name': 'urn:ogc:def:crs:EPSG::3857'}}},
+            'properties': {'id': name, 'orbitDirection': orbit_direction}}
+
+
+def test_filter_empty_table():
+    table = SceneTable([])
+    assert len(table.filter(polar='DV')) == 0
+    assert len(table.filter(polar='DV', bbox=[(0., 0., 10., 10.)], orbit_path=['ASC', 'DES'])) == 0
+
+
+def test_filter_emptied_table():
+    table = SceneTable([feature(), feature(orbit_direction='ASCENDING')]).filter(polar='SV')
+    assert len(table) == 0
+    assert len(table.filter(orbit_path='DES')) == 0
+
+
+def test_filter_rows():
+    table = SceneTable([feature(), feature(polar='SV'), feature(orbit_direction='ASCENDING')])
+    assert len(table.filter(polar='DV')) == 2
+    assert len(table.filter(polar='DV', orbit_path='ASC')) == 1
+    assert len(table.filter(bbox=[(0., 0., 10., 10.)])) == 3
+    assert len(table.filter(bbox=[(0., 0., 10., 11.)])) == 0
+
+
+def test_search_without_scenes(tmp_path, monkeypatch):
+    sentinel = GetSentinel(Config.load().replace(output=str(tmp_path), catalog=False))
+    monkeypatch.setattr(sentinel, 'search_pages', lambda period: [])
+    sentinel.search([11800000, 1100000, 11810000, 1110000], 3857, ('20200101', '20200131'))
+    assert len(sentinel._table) == 0
+    assert len(sentinel.filter(True, orbit_path='DES')._table) == 0
+
+
+def slice_feature(start, x0, x1):
+    geojson = feature(start=start)
+    geojson['geometry']['coordinates'] = [[[x0, 1100000], [x1, 1100000], [x1, 1110000], [x0, 1110000], [x0, 1100000]]]
+    geojson['bbox'] = [x0, 1100000, x1, 1110000]
+    return geojson
+
+
+def test_download_merges_slices_of_same_name(tmp_path, monkeypatch):
+    config = Config.load().replace(output=str(tmp_path), catalog=False, cache=False, cube=False, data_mask=False,
+                                   polar_modes=['VH'], img_width=250, img_height=250, resolution=20, max_workers=2)
+    sentinel = GetSentinel(config)
+    slices = [slice_feature('20200105T224500', 11800000, 11806000),
+              slice_feature('20200105T224525', 11804000, 11810000)]
+    monkeypatch.setattr(sentinel, 'search_pages', lambda period: slices)
+    sentinel.search([11800000, 1100000, 11810000, 1110000], 3857, ('20200101', '20200131'))
+    assert len(sentinel._scenes) == 2
+    assert len({sentinel.scene_name(scene, 'Tile') for scene in sentinel._scenes}) == 1
+    values = {scene.from_time: value for scene, value in zip(sentinel._scenes, (0.1, 0.2))}
+    monkeypatch.setattr(sentinel, 'request', lambda scene, bbox, shape, polars=None:
+                        {polar: numpy.full(shape[::-1], values[scene.from_time], dtype='float32') for polar in polars})
+
+    sentinel.download('Tile')
+
+    files = os.listdir(tmp_path / 'Tile' / 'scenes')
+    assert files == [sentinel.scene_name(sentinel._scenes[0], 'Tile', 'VH')]
+    with raster_open(tmp_path / 'Tile' / 'scenes' / files[0]) as dataset:
+        gamma0 = dataset.read(1)
+    assert (gamma0 != -999).all()
+    assert numpy.allclose(gamma0[:, :150], 0.1) and numpy.allclose(gamma0[:, 250:], 0.2)
@@ -0,0 +1,10 @@
+from georice import ricemap
+from georice.ricemap import Ricemap
+
+
+def test_ricemap_job_uses_memory_config(tmp_path, monkeypatch):
+    jobs = []
+    monkeypatch.setattr(ricemap, 'run', jobs.append)
+    config = {'output': str(tmp_path), 'engine': 'numpy', 'out_of_core': True, 'max_memory_gb': 2.5}
+    Ricemap(config).ricemap_get('Tile', '018', ('20200101', '20200131'), 'DES')
+    assert (jobs[0].engine, jobs[0].out_of_core, jobs[0].max_memory_gb) == ('numpy', True, 2.5)
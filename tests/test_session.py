@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from georice import session as session_module
+from georice.session import SentinelSession
+
+
+class FakeHttp:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+
+def response(status, headers=None, body=None):
+    return SimpleNamespace(status_code=status, headers=headers or {}, json=lambda: body)
+
+
+def make_session(responses, **kwargs):
+    config = SimpleNamespace(sh_client_id='id', sh_client_secret='secret', sh_auth_base_url='https://auth',
+                             download_timeout_seconds=30)
+    session = SentinelSession(config, **kwargs)
+    session.http = FakeHttp(responses)
+    return session
+
+
+def test_requests_use_timeout_of_config():
+    session = make_session([response(200)])
+    session.get('https://wfs')
+    assert session.http.calls[0][2]['timeout'] == 30
+
+
+def test_rate_limited_request_waits_retry_after(monkeypatch):
+    delays = []
+    monkeypatch.setattr(session_module.time, 'sleep', delays.append)
+    session = make_session([response(200, body={'access_token': 'token', 'expires_in': 3600}),
+                            response(429, {'Retry-After': '3'}), response(429), response(200)])
+    assert session.post('https://process').status_code == 200
+    assert delays == [3.0, 2.0] and session.throttled == 2
+    assert all(call[2]['timeout'] == 30 for call in session.http.calls)
+
+
+def test_rate_limit_retries_are_limited(monkeypatch):
+    monkeypatch.setattr(session_module.time, 'sleep', lambda delay: None)
+    session = make_session([response(429)] * 3, rate_limit_retries=2)
+    assert session.get('https://wfs').status_code == 429
+    assert len(session.http.calls) == 3
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from georice import engine
+
+
+def stack(height, width, dates, seed=0):
+    rng = np.random.default_rng(seed)
+    vh = rng.gamma(4.4, 0.05 / 4.4, (height, width, dates)).astype(np.float32)
+    vh[rng.random(vh.shape) < 0.1] = -999
+    vh[rng.random(vh.shape) < 0.1] = 0.001
+    vh[rng.random(vh.shape) < 0.01] = np.inf
+    # pixel without data and pixel with data of a single date
+    vh[0, 0, :] = -999
+    vh[0, 1, :] = -999
+    vh[0, 1, dates // 2] = 0.05
+    time_0 = np.cumsum(rng.integers(6, 13, dates)).astype(np.int64)
+    return vh, time_0
+
+
+@pytest.mark.parametrize('kernel', [engine.global_statistics, engine.global_statistics_parallel])
+def test_numba_kernel_equals_numpy(kernel):
+    vh, time_0 = stack(37, 29, 24)
+    expected = engine.global_statistics_numpy(vh, time_0)
+    outputs = kernel(vh, time_0)
+    for a, b in zip(expected, outputs):
+        assert a.dtype == b.dtype == np.float32
+        assert np.array_equal(a.view(np.uint32), b.view(np.uint32))
+
+
+def test_numpy_engine_without_numba():
+    script = '''
+import sys
+sys.modules['numba'] = None
+import numpy as np
+import georice
+from georice import engine
+assert engine.numba is None and engine.STATISTICS_ENGINE == 'numpy'
+assert engine.RicemapJob('.', '018', '20200101', '20200131', '.').engine == 'numpy'
+vh = np.random.default_rng(0).gamma(4.4, 0.05 / 4.4, (8, 8, 6)).astype(np.float32)
+vh[0, 0, :] = -999
+outputs = engine.global_statistics_numpy(vh, np.cumsum(np.full(6, 12)))
+assert all(output.shape == (8, 8) and np.isfinite(output[1:, 1:]).all() for output in outputs)
+'''
+    subprocess.run([sys.executable, '-c', script], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))